@@ -1,56 +1,128 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 from models.road_network import RoadNetwork
-from models.risk_calculator import RiskCalculator
-from models.path_finder import PathFinder
+from models.risk_calculator import RiskCalculator, prepare_risk
 from models.safe_havens import SafeHavenFinder
+from models.compact_network import CompactNetwork
+from models.instrumentation import metrics, profiler, process_rss_bytes
+from models.partitions import PartitionedNetwork, is_partition_dir, make_path_finder
+from models.route_service import RouteService, ServiceBusy, compute_route
 from datetime import datetime
 import traceback
+import concurrent.futures as cf
+import gc
 import os
 import pickle
 import json
-import networkx as nx
+import subprocess
+import sys
+import threading
+import time
 
 app = Flask(__name__)
 CORS(app, origins="http://localhost:3000", supports_credentials=True)
 
 # Global variables
-current_graph = None
+current_network = None
 current_location = None
 pf = None
 shf = None
-rc = None
+memory_reports = {}
 
 DATA_DIR = "backend/data"
+PARTITION_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'partition_location.py')
+
+# Background partition builds by location name
+partition_jobs = {}
+partition_jobs_lock = threading.Lock()
+
+# SHEILDX_SERVE_MODE=async runs route searches on a worker pool with request coalescing
+SERVE_MODE = os.environ.get('SHEILDX_SERVE_MODE', 'sync')
+route_service = None
+if SERVE_MODE == 'async':
+    route_service = RouteService(
+        workers=int(os.environ.get('SHEILDX_WORKERS', 0)) or None,
+        max_pending=int(os.environ.get('SHEILDX_MAX_PENDING', 64)),
+        timeout=float(os.environ.get('SHEILDX_ROUTE_TIMEOUT', 30)),
+        executor=os.environ.get('SHEILDX_EXECUTOR', 'process')
+    )
 
 def ensure_data_directory():
     """Create data directory if it doesn't exist"""
     os.makedirs(DATA_DIR, exist_ok=True)
 
-def initialize_components(graph, location_name):
-    """Initialize all components with a graph"""
-    global rc, pf, shf
+def to_mb(num_bytes):
+    return round(num_bytes / (1024 * 1024), 1) if num_bytes is not None else None
+
+def serve_network(network, location_name):
+    """Point the path finder, route service and safe havens at a network"""
+    global current_network, pf, shf
     
+    current_network = network
+    pf = make_path_finder(network)
+    if route_service is not None:
+        route_service.reset(network)
+    with metrics.timer('prepare_safe_havens_ms'):
+        shf = SafeHavenFinder(network, location_name)
+        shf.create_sample_safe_locations()
+    
+    metrics.set_gauge('graph_nodes', network.num_nodes)
+    metrics.set_gauge('graph_edges', network.num_edges)
+
+def record_memory(location_name, network, **rss):
+    """Store the memory report for a loaded location"""
+    report = network.memory_report()
+    report.update({name: to_mb(value) for name, value in rss.items()})
+    report['rss_serving_mb'] = to_mb(process_rss_bytes())
+    report['compact_mb'] = to_mb(report['total_bytes'])
+    memory_reports[location_name] = report
+    metrics.set_gauge('network_bytes', report['total_bytes'])
+    return report
+
+def initialize_components(graph, location_name):
+    """Prepare risks on a graph, then serve from a compact copy and clear the graph"""
     try:
-        rc = RiskCalculator(graph)
-        rc.assign_base_risk_by_road_type()
-        rc.create_sample_incidents()
-        rc.add_incident_risk()
-        rc.apply_time_factor()
-        rc.propagate_risk()
-        rc.calculate_node_risk()
+        rss_loaded = process_rss_bytes()
+        prepare_risk(graph)
         
-        pf = PathFinder(graph)
-        shf = SafeHavenFinder(graph, location_name)
-        shf.create_sample_safe_locations()
+        with metrics.timer('prepare_compact_ms'):
+            network = CompactNetwork.from_graph(graph)
+        rss_prepared = process_rss_bytes()
+        
+        serve_network(network, location_name)
+        
+        # Drop the networkx graph; everything is served from the arrays now
+        graph.clear()
+        gc.collect()
+        
+        report = record_memory(location_name, network, rss_loaded_mb=rss_loaded, rss_prepared_mb=rss_prepared)
         
         print(f"✅ Components initialized successfully")
+        print(f"💾 {location_name}: compact network {report['compact_mb']} MB, RSS {report['rss_prepared_mb']} MB -> {report['rss_serving_mb']} MB")
         return True
     except Exception as e:
         print(f"❌ Error initializing components: {e}")
         traceback.print_exc()
         return False
 
+def initialize_partitions(directory, location_name):
+    """Serve a partitioned location; cells are loaded as routes reach them"""
+    try:
+        network = PartitionedNetwork(directory, int(os.environ.get('SHEILDX_MAX_PARTITIONS', 8)),
+                                     risk_multiplier=RiskCalculator.time_multiplier())
+        serve_network(network, location_name)
+        gc.collect()
+        
+        report = record_memory(location_name, network)
+        
+        print(f"✅ Components initialized successfully")
+        print(f"💾 {location_name}: {report['partitions']} partitions, {len(report['resident'])} resident, {report['compact_mb']} MB")
+        return True
+    except Exception as e:
+        print(f"❌ Error initializing partitions: {e}")
+        traceback.print_exc()
+        return False
+
 # Try to load existing location on startup
 print("=" * 50)
 print("SHEild-X Backend Server")
@@ -58,24 +130,40 @@ print("=" * 50)
 
 ensure_data_directory()
 existing_files = [f for f in os.listdir(DATA_DIR) if f.endswith('.pkl')]
+existing_partitions = [f for f in os.listdir(DATA_DIR) if is_partition_dir(os.path.join(DATA_DIR, f))]
 
+# A partitioned build of a location is served in place of its .pkl
+startup_partitions = None
 if existing_files:
+    if existing_files[0].replace('.pkl', '_partitions') in existing_partitions:
+        startup_partitions = existing_files[0].replace('.pkl', '_partitions')
+elif existing_partitions:
+    startup_partitions = existing_partitions[0]
+
+if startup_partitions:
+    print(f"📂 Found partitioned data: {startup_partitions}")
+    current_location = startup_partitions
+    if not initialize_partitions(os.path.join(DATA_DIR, startup_partitions), current_location):
+        current_location = None
+
+# Fall back to the .pkl if its partitions could not be opened
+if existing_files and current_location is None:
     file_path = os.path.join(DATA_DIR, existing_files[0])
     print(f"📂 Found existing data: {existing_files[0]}")
     try:
         with open(file_path, 'rb') as f:
-            current_graph = pickle.load(f)
+            graph = pickle.load(f)
         current_location = existing_files[0].replace('.pkl', '')
-        if initialize_components(current_graph, current_location):
-            print(f"✅ Loaded {current_location} with {len(current_graph.nodes)} nodes")
+        if initialize_components(graph, current_location):
+            print(f"✅ Loaded {current_location} with {current_network.num_nodes} nodes")
         else:
-            current_graph = None
             current_location = None
+        del graph
     except Exception as e:
         print(f"❌ Error loading existing file: {e}")
-        current_graph = None
+        current_network = None
         current_location = None
-else:
+elif not existing_files and not existing_partitions:
     print("📂 No existing data found. Please download a location.")
 
 print("🚀 Server ready for connections!")
@@ -84,13 +172,14 @@ print("=" * 50)
 @app.route('/api/status', methods=['GET'])
 def get_status():
     """Get backend status"""
-    global current_graph, current_location
+    global current_network, current_location
     return jsonify({
         'status': 'running',
         'location_loaded': current_location is not None,
         'current_location': current_location,
-        'nodes': len(current_graph.nodes) if current_graph else 0,
-        'edges': len(current_graph.edges) if current_graph else 0
+        'serve_mode': SERVE_MODE,
+        'nodes': current_network.num_nodes if current_network else 0,
+        'edges': current_network.num_edges if current_network else 0
     })
 
 @app.route('/api/locations', methods=['GET'])
@@ -108,6 +197,13 @@ def get_saved_locations():
                     'name': name.replace('_', ' ').title(),
                     'file': file_path
                 })
+            elif is_partition_dir(os.path.join(DATA_DIR, file)):
+                locations.append({
+                    'id': file,
+                    'name': file.replace('_', ' ').title(),
+                    'file': os.path.join(DATA_DIR, file),
+                    'partitioned': True
+                })
     except Exception as e:
         print(f"Error listing locations: {e}")
     
@@ -116,7 +212,7 @@ def get_saved_locations():
 @app.route('/api/load-location', methods=['POST'])
 def load_location():
     """Load a saved location"""
-    global current_graph, current_location, rc, pf, shf
+    global current_network, current_location, pf, shf
     
     data = request.get_json()
     if not data:
@@ -127,17 +223,31 @@ def load_location():
         return jsonify({'error': 'File not found'}), 404
     
     try:
+        if is_partition_dir(file_path):
+            current_location = os.path.basename(os.path.normpath(file_path))
+            if initialize_partitions(file_path, current_location):
+                return jsonify({
+                    'success': True,
+                    'location': current_location,
+                    'nodes': current_network.num_nodes,
+                    'edges': current_network.num_edges,
+                    'partitioned': True,
+                    'memory': memory_reports.get(current_location)
+                })
+            return jsonify({'error': 'Failed to initialize components'}), 500
+        
         with open(file_path, 'rb') as f:
-            current_graph = pickle.load(f)
+            graph = pickle.load(f)
         
         current_location = os.path.basename(file_path).replace('.pkl', '')
         
-        if initialize_components(current_graph, current_location):
+        if initialize_components(graph, current_location):
             return jsonify({
                 'success': True,
                 'location': current_location,
-                'nodes': len(current_graph.nodes),
-                'edges': len(current_graph.edges)
+                'nodes': current_network.num_nodes,
+                'edges': current_network.num_edges,
+                'memory': memory_reports.get(current_location)
             })
         else:
             return jsonify({'error': 'Failed to initialize components'}), 500
@@ -150,7 +260,7 @@ def load_location():
 @app.route('/api/download-location', methods=['POST'])
 def download_location():
     """Download a new location"""
-    global current_graph, current_location, rc, pf, shf
+    global current_network, current_location, pf, shf
     
     data = request.get_json()
     if not data:
@@ -191,10 +301,9 @@ def download_location():
             json.dump(metadata, f)
         
         # Auto-load the downloaded location
-        current_graph = G
         current_location = safe_name
         
-        if initialize_components(current_graph, current_location):
+        if initialize_components(G, current_location):
             print(f"✅ Downloaded and loaded: {location}")
             return jsonify({
                 'success': True,
@@ -209,6 +318,97 @@ def download_location():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+def watch_partition_job(name, source):
+    """Wait for a background partition build, then serve it if its location is the one being served"""
+    global current_location
+    
+    job = partition_jobs[name]
+    returncode = job['process'].wait()
+    job['finished'] = datetime.now().isoformat()
+    job['returncode'] = returncode
+    if returncode != 0:
+        job['status'] = 'failed'
+        print(f"❌ Partition build for {name} failed with exit code {returncode}")
+        return
+    
+    job['status'] = 'done'
+    print(f"✅ Partition build for {name} finished")
+    if current_location in (name, source):
+        current_location = name
+        if not initialize_partitions(os.path.join(DATA_DIR, name), name):
+            job['status'] = 'built, failed to serve'
+
+def partition_job_report(name, job):
+    """JSON-friendly view of a partition job, with build stats once it is done"""
+    report = {key: value for key, value in job.items() if key != 'process'}
+    if job['status'] == 'done':
+        with open(os.path.join(DATA_DIR, name, 'manifest.json')) as f:
+            manifest = json.load(f)
+        report.update({
+            'partitions': len(manifest['partitions']),
+            'nodes': manifest['nodes'],
+            'edges': manifest['edges'],
+            'overlay_edges': manifest['overlay_edges'],
+            'build_seconds': manifest['build_seconds']
+        })
+    return report
+
+@app.route('/api/partition-location', methods=['GET', 'POST'])
+def partition_location():
+    """Start splitting a saved location into on-disk partitions, or report on the builds"""
+    if request.method == 'GET':
+        with partition_jobs_lock:
+            jobs = dict(partition_jobs)
+        return jsonify({'jobs': {name: partition_job_report(name, job) for name, job in jobs.items()}})
+    
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+    
+    file_path = data.get('file')
+    if not file_path or not os.path.isfile(file_path):
+        return jsonify({'error': 'File not found'}), 404
+    
+    try:
+        cell_size_m = float(data.get('cell_size_m', 5000))
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f'Invalid cell size: {e}'}), 400
+    if cell_size_m <= 0:
+        return jsonify({'error': 'Cell size must be positive'}), 400
+    
+    source = os.path.basename(file_path).replace('.pkl', '')
+    name = source + '_partitions'
+    directory = os.path.join(DATA_DIR, name)
+    
+    # The build runs in its own process so the graph is never loaded into the server
+    with partition_jobs_lock:
+        job = partition_jobs.get(name)
+        if job is not None and job['status'] == 'building':
+            return jsonify({'error': f'{name} is already being built', 'job': partition_job_report(name, job)}), 409
+        try:
+            process = subprocess.Popen([sys.executable, PARTITION_SCRIPT, file_path,
+                                        '--cell-size-m', str(cell_size_m), '--out', directory])
+        except OSError as e:
+            print(f"❌ Partition error: {e}")
+            return jsonify({'error': str(e)}), 500
+        partition_jobs[name] = {
+            'status': 'building',
+            'file': file_path,
+            'directory': directory,
+            'cell_size_m': cell_size_m,
+            'started': datetime.now().isoformat(),
+            'process': process
+        }
+    threading.Thread(target=watch_partition_job, args=(name, source), daemon=True).start()
+    
+    print(f"🧩 Partitioning {file_path} into {cell_size_m:.0f}m cells in the background (pid {process.pid})")
+    return jsonify({
+        'success': True,
+        'status': 'building',
+        'location': name,
+        'file': directory
+    }), 202
+
 @app.route('/api/route-with-instructions', methods=['POST', 'OPTIONS'])
 def find_route_with_instructions():
     """Find route and generate turn-by-turn instructions"""
@@ -227,6 +427,9 @@ def find_route_with_instructions():
     if pf is None:
         return jsonify({'error': 'No location loaded. Please download a location first.'}), 400
     
+    request_start = time.perf_counter()
+    metrics.increment('route_requests')
+    
     try:
         data = request.get_json()
         if not data:
@@ -251,53 +454,31 @@ def find_route_with_instructions():
         
         print(f"From: ({start_lat:.4f}, {start_lon:.4f}) To: ({end_lat:.4f}, {end_lon:.4f})")
         
-        # Find nearest nodes
-        source = pf.find_nearest_node(start_lat, start_lon)
-        target = pf.find_nearest_node(end_lat, end_lon)
-        
-        if source is None or target is None:
-            return jsonify({'error': 'Could not find nearby roads'}), 404
-        
-        print(f"Source node: {source}, Target node: {target}")
-        
-        # Find safest path
-        path_nodes = pf.find_safest_route(source, target)
-        
-        if not path_nodes:
-            return jsonify({'error': 'No path found between these points'}), 404
-        
-        print(f"✅ Path found with {len(path_nodes)} nodes")
-        
-        # Convert to coordinates
-        path_coords = pf.path_to_coordinates(path_nodes)
-        
-        # Calculate statistics
-        risk = pf.calculate_path_risk(path_nodes)
-        distance = pf.calculate_path_distance(path_nodes)
-        instructions = pf.generate_route_instructions(path_nodes)
-        
-        response_data = {
-            'success': True,
-            'path': path_coords,
-            'instructions': instructions,
-            'statistics': {
-                'risk': risk,
-                'distance_m': distance,
-                'distance_km': round(distance / 1000, 2),
-                'time_min': round((distance / 1000) / 40 * 60, 1),
-                'mode': 'safest'
-            }
-        }
+        if route_service is not None:
+            try:
+                status, response_data = route_service.route(start_lat, start_lon, end_lat, end_lon)
+            except ServiceBusy as e:
+                print(f"⏳ Route request rejected: {e}")
+                return jsonify({'error': 'Server busy, please retry shortly'}), 503, {'Retry-After': '1'}
+            except cf.TimeoutError:
+                metrics.increment('route_timeouts')
+                return jsonify({'error': 'Route computation timed out'}), 504
+            except cf.CancelledError:
+                return jsonify({'error': 'Location changed while routing, please retry'}), 503, {'Retry-After': '1'}
+        else:
+            status, response_data = compute_route(pf, start_lat, start_lon, end_lat, end_lon)
         
-        print(f"📊 Route stats: {response_data['statistics']['distance_km']}km, {response_data['statistics']['time_min']}min, risk: {risk:.2f}")
-        return jsonify(response_data)
+        with metrics.timer('route_serialisation_ms'):
+            response = jsonify(response_data)
+        return response, status
         
-    except nx.NetworkXNoPath:
-        return jsonify({'error': 'No path found between these points'}), 404
     except Exception as e:
+        metrics.increment('route_errors')
         print(f"❌ Route error: {e}")
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
+    finally:
+        metrics.observe('route_total_ms', (time.perf_counter() - request_start) * 1000)
 
 @app.route('/api/safe-havens', methods=['GET'])
 def get_safe_havens():
@@ -307,5 +488,48 @@ def get_safe_havens():
         return jsonify({'havens': []})
     return jsonify({'havens': shf.safe_havens})
 
+@app.route('/api/memory', methods=['GET'])
+def get_memory():
+    """Get the memory report for each location loaded since startup"""
+    return jsonify({
+        'current_location': current_location,
+        'rss_mb': to_mb(process_rss_bytes()),
+        'current': current_network.memory_report() if current_network else None,
+        'route_workers': route_service.worker_memory() if route_service is not None else None,
+        'locations': memory_reports
+    })
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Get latency histograms, counters and gauges"""
+    if request.args.get('format') == 'prometheus':
+        return Response(metrics.to_prometheus(), mimetype='text/plain; version=0.0.4')
+    return jsonify(metrics.snapshot())
+
+@app.route('/api/profiler', methods=['GET', 'POST'])
+def profiler_control():
+    """Toggle the sampling profiler or read its report"""
+    if request.method == 'GET':
+        limit = request.args.get('limit', 20, type=int)
+        return jsonify(profiler.report(limit))
+    
+    data = request.get_json() or {}
+    if data.get('reset'):
+        profiler.reset()
+    if 'enabled' in data:
+        if data['enabled']:
+            interval_ms = data.get('interval_ms')
+            try:
+                profiler.enable(float(interval_ms) / 1000 if interval_ms is not None else None)
+            except (ValueError, TypeError) as e:
+                return jsonify({'error': f'Invalid interval: {e}'}), 400
+        else:
+            profiler.disable()
+    return jsonify({'enabled': profiler.enabled, 'interval_ms': profiler.interval * 1000})
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5000, host='0.0.0.0')
\ No newline at end of file
+    if route_service is not None:
+        # The reloader would fork a second copy of the worker pool
+        app.run(debug=False, threaded=True, port=5000, host='0.0.0.0')
+    else:
+        app.run(debug=True, port=5000, host='0.0.0.0')
\ No newline at end of file
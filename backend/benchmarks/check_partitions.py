@@ -0,0 +1,170 @@
+"""Check that a partitioned location serves the same risks and routes as the monolithic pipeline.
+
+Builds partitions of a network, then for each hour compares them with the same network
+prepared in one piece by prepare_risk: every edge and node risk, and the cost, risk and
+distance of routes between random node pairs.
+
+Examples:
+    python backend/benchmarks/check_partitions.py --kind random --size 100000 --hours 3 12
+    python backend/benchmarks/check_partitions.py --saved backend/data/coimbatore.pkl --cell-size-m 2000
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+from collections import defaultdict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import numpy as np
+from models.compact_network import CompactNetwork
+from models.partitions import PartitionedNetwork, PartitionedPathFinder, build_partitions
+from models.path_finder import PathFinder
+from models.risk_calculator import RiskCalculator, TIME_MULTIPLIERS, prepare_risk
+from synthetic_graphs import GENERATORS, load_saved_graph
+
+
+@contextlib.contextmanager
+def quiet(enabled=True):
+    """Swallow the models' progress prints"""
+    if not enabled:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def monolithic_edges(network):
+    """{(u, v): sorted risks of the parallel edges u -> v} over OSM ids"""
+    edges = defaultdict(list)
+    sources = np.repeat(network.node_ids, np.diff(network.indptr)).tolist()
+    targets = network.node_ids[network.indices].tolist()
+    for u, v, risk in zip(sources, targets, network.edge_risk.tolist()):
+        edges[(u, v)].append(risk)
+    return {key: sorted(risks) for key, risks in edges.items()}
+
+
+def partitioned_risks(partitioned):
+    """Edge risks in the same form as monolithic_edges, plus {node: risk}, across every cell"""
+    edges = defaultdict(list)
+    node_risk = {}
+    for pid in range(len(partitioned.partitions)):
+        network, _ = partitioned.partition(pid)
+        for key, risks in monolithic_edges(network).items():
+            edges[key].extend(risks)
+        node_risk.update(zip(network.node_ids.tolist(), network.node_risk.tolist()))
+    for u, v, risk in zip(partitioned.cut_u.tolist(), partitioned.cut_v.tolist(), partitioned.cut_risk.tolist()):
+        edges[(u, v)].append(risk)
+    return {key: sorted(risks) for key, risks in edges.items()}, node_risk
+
+
+def path_cost(pf, path):
+    """Cost of a path under the monolithic path finder's edge weights"""
+    network = pf.network
+    indices = [network.index_of(node) for node in path]
+    return sum(float(pf.weights[network.edge_between(u, v, pf.weights)]) for u, v in zip(indices, indices[1:]))
+
+
+def check_hour(graph, directory, hour, args, rng):
+    """Compare the partitions against the monolithic pipeline at one hour; returns the failures"""
+    with quiet(not args.verbose):
+        prepared = graph.copy()
+        prepare_risk(prepared, current_hour=hour)
+        mono = PathFinder(CompactNetwork.from_graph(prepared))
+        del prepared
+        partitioned = PartitionedNetwork(directory, max_resident=sys.maxsize,
+                                         risk_multiplier=RiskCalculator.time_multiplier(hour))
+        part = PartitionedPathFinder(partitioned)
+        part_edges, part_nodes = partitioned_risks(partitioned)
+    mono_edges = monolithic_edges(mono.network)
+
+    failures = []
+    if set(mono_edges) != set(part_edges):
+        failures.append(f"edge sets differ: {len(set(mono_edges) ^ set(part_edges))} (u, v) pairs")
+    edge_diff = max((abs(a - b) for key in mono_edges.keys() & part_edges.keys()
+                     for a, b in zip(mono_edges[key], part_edges[key])), default=0.0)
+    mono_nodes = dict(zip(mono.network.node_ids.tolist(), mono.network.node_risk.tolist()))
+    node_diff = max(abs(risk - part_nodes.get(node, np.nan)) for node, risk in mono_nodes.items())
+    if edge_diff > args.tolerance:
+        failures.append(f"edge risk differs by up to {edge_diff:.6f}")
+    if not node_diff <= args.tolerance:
+        failures.append(f"node risk differs by up to {node_diff:.6f}")
+
+    nodes = mono.network.node_ids.tolist()
+    route_failures = 0
+    with quiet(not args.verbose):
+        for _ in range(args.routes):
+            source, target = rng.sample(nodes, 2)
+            expected = mono.find_safest_route(source, target)
+            actual = part.find_safest_route(source, target)
+            if expected is None or actual is None:
+                route_failures += (expected is None) != (actual is None)
+                continue
+            expected_cost, actual_cost = path_cost(mono, expected), path_cost(mono, actual)
+            if (abs(expected_cost - actual_cost) > args.tolerance * max(1.0, expected_cost)
+                    or abs(mono.calculate_path_risk(expected) - part.calculate_path_risk(actual)) > args.tolerance * 10
+                    or abs(mono.calculate_path_distance(expected) - part.calculate_path_distance(actual)) > 1e-3 * max(1.0, mono.calculate_path_distance(expected))):
+                route_failures += 1
+    if route_failures:
+        failures.append(f"{route_failures}/{args.routes} routes differ in cost, risk or distance")
+
+    status = '✅' if not failures else '❌'
+    print(f"{status} hour {hour:>2} (x{RiskCalculator.time_multiplier(hour)}): "
+          f"max edge risk diff {edge_diff:.2e}, max node risk diff {node_diff:.2e}, "
+          f"{args.routes - route_failures}/{args.routes} routes match")
+    for failure in failures:
+        print(f"   {failure}")
+    return failures
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare partitioned and monolithic SHEild-X networks")
+    parser.add_argument('--kind', default='random', choices=sorted(GENERATORS))
+    parser.add_argument('--size', type=int, default=20000, help="Target edge count of the synthetic graph")
+    parser.add_argument('--saved', help="Check a saved .pkl graph instead of a synthetic one")
+    parser.add_argument('--cell-size-m', type=float, default=2000)
+    parser.add_argument('--hours', type=int, nargs='+', default=[end_hour - 1 for end_hour, _ in TIME_MULTIPLIERS],
+                        help="Hours of the day to check (default: one per time period)")
+    parser.add_argument('--routes', type=int, default=30, help="Random routes compared per hour")
+    parser.add_argument('--tolerance', type=float, default=1e-5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--verbose', action='store_true', help="Show the models' progress output")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.saved:
+        graph = load_saved_graph(os.path.abspath(args.saved))
+    else:
+        graph = GENERATORS[args.kind](args.size, seed=args.seed)
+    rng = random.Random(args.seed)
+
+    failures = []
+    # The models write sample data relative to the working directory
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            directory = os.path.join(workdir, 'partitions')
+            print(f"🧩 Partitioning {graph.number_of_edges()} edges into {args.cell_size_m:.0f}m cells...")
+            with quiet(not args.verbose):
+                build_partitions(graph, directory, args.cell_size_m,
+                                 prepare=lambda sub: prepare_risk(sub, time_factor=False),
+                                 risk_multipliers=[m for _, m in TIME_MULTIPLIERS])
+            for hour in args.hours:
+                failures.extend(check_hour(graph, directory, hour, args, rng))
+        finally:
+            os.chdir(cwd)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,286 @@
+"""Benchmark the routing backend on synthetic and saved road networks.
+
+Examples:
+    python backend/benchmarks/run_benchmarks.py --sizes 10000 100000 --output bench.json
+    python backend/benchmarks/run_benchmarks.py --saved backend/data/coimbatore.pkl --compare bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from models.compact_network import CompactNetwork
+from models.risk_calculator import RiskCalculator
+from models.path_finder import PathFinder
+from synthetic_graphs import GENERATORS, load_saved_graph
+
+RISK_STAGES = [
+    'assign_base_risk_by_road_type',
+    'create_sample_incidents',
+    'add_incident_risk',
+    'propagate_risk',
+    'apply_time_factor',
+    'calculate_node_risk',
+]
+
+
+@contextlib.contextmanager
+def quiet(enabled=True):
+    """Swallow the models' progress prints while timing"""
+    if not enabled:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def summarize(times_ms):
+    """Summary statistics for a list of timings"""
+    return {
+        'runs': len(times_ms),
+        'median_ms': round(statistics.median(times_ms), 3),
+        'mean_ms': round(statistics.mean(times_ms), 3),
+        'min_ms': round(min(times_ms), 3),
+        'max_ms': round(max(times_ms), 3),
+        'stdev_ms': round(statistics.stdev(times_ms), 3) if len(times_ms) > 1 else 0.0,
+    }
+
+
+def time_call(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def random_points(graph, count, rng):
+    """Query coordinates near random graph nodes"""
+    nodes = list(graph.nodes)
+    points = []
+    for node in rng.sample(nodes, min(count, len(nodes))):
+        points.append((graph.nodes[node]['y'] + rng.uniform(-2e-4, 2e-4),
+                       graph.nodes[node]['x'] + rng.uniform(-2e-4, 2e-4)))
+    return points
+
+
+def random_pairs(graph, count, rng):
+    nodes = list(graph.nodes)
+    return [tuple(rng.sample(nodes, 2)) for _ in range(count)]
+
+
+def bench_risk_pipeline(graph, pristine, args):
+    """Time each RiskCalculator stage; earlier runs work on copies of the raw graph"""
+    results = {f"risk.{stage}": [] for stage in RISK_STAGES}
+    for run in range(args.pipeline_runs):
+        target = graph if run == args.pipeline_runs - 1 else pristine.copy()
+        with quiet(not args.verbose):
+            rc = RiskCalculator(target)
+            for stage in RISK_STAGES:
+                elapsed, _ = time_call(getattr(rc, stage))
+                results[f"risk.{stage}"].append(elapsed)
+    return results
+
+
+def bench_compact(graph, args):
+    times = []
+    for _ in range(args.pipeline_runs):
+        elapsed, network = time_call(CompactNetwork.from_graph, graph)
+        times.append(elapsed)
+    return {'compact.from_graph': times}, network
+
+
+def bench_snapping(pf, graph, args, rng):
+    times = []
+    for lat, lon in random_points(graph, args.queries, rng):
+        elapsed, _ = time_call(pf.find_nearest_node, lat, lon)
+        times.append(elapsed)
+    return {'snap.find_nearest_node': times}
+
+
+def bench_routing(pf, graph, args, rng):
+    times = []
+    for source, target in random_pairs(graph, args.queries, rng):
+        pf.route_cache.clear()
+        with quiet(not args.verbose):
+            elapsed, _ = time_call(pf.find_safest_route, source, target)
+        times.append(elapsed)
+    return {'route.find_safest_route': times}
+
+
+def bench_endpoint(graph, label, args, rng):
+    """Full /api/route-with-instructions round-trips on an unprepared graph, which the app prepares and clears"""
+    points = random_points(graph, args.queries * 2, rng)
+    with quiet(not args.verbose):
+        import app as backend_app
+        backend_app.current_location = label
+        backend_app.initialize_components(graph, label)
+    client = backend_app.app.test_client()
+
+    times = []
+    statuses = {}
+    for start, end in zip(points[::2], points[1::2]):
+        body = {'start': {'lat': start[0], 'lon': start[1]}, 'end': {'lat': end[0], 'lon': end[1]}}
+        with quiet(not args.verbose):
+            elapsed, response = time_call(client.post, '/api/route-with-instructions', json=body)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        times.append(elapsed)
+    return {'endpoint.route_with_instructions': times}, statuses
+
+
+def run_graph(graph, label, args):
+    rng = random.Random(args.seed)
+    nodes, edges = len(graph.nodes), len(graph.edges)
+    print(f"📊 {label}: {nodes} nodes, {edges} edges")
+
+    # Raw copy for repeated pipeline runs and for the app, which prepares risk itself
+    pristine = graph.copy()
+    timings = bench_risk_pipeline(graph, pristine, args)
+    compact_timings, network = bench_compact(graph, args)
+    timings.update(compact_timings)
+    with quiet(not args.verbose):
+        pf = PathFinder(network)
+    timings.update(bench_snapping(pf, graph, args, rng))
+    timings.update(bench_routing(pf, graph, args, rng))
+
+    extra = {'compact.from_graph': {'memory': network.memory_report()}}
+    del pf, network, graph
+    if not args.skip_endpoint:
+        endpoint_timings, statuses = bench_endpoint(pristine, label, args, rng)
+        timings.update(endpoint_timings)
+        extra['endpoint.route_with_instructions'] = {'status_codes': statuses}
+
+    results = []
+    for name, times in timings.items():
+        entry = {'graph': label, 'nodes': nodes, 'edges': edges, 'benchmark': name}
+        entry.update(summarize(times))
+        entry.update(extra.get(name, {}))
+        results.append(entry)
+        print(f"  {name:<40} median {entry['median_ms']:>10.3f} ms  ({entry['runs']} runs)")
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold, min_runs=3):
+    """Print per-benchmark ratios against a previous run and return regressions.
+
+    Benchmarks with fewer than min_runs samples on either side are reported but never flagged.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(r['graph'], r['benchmark']): r for r in baseline.get('results', [])}
+
+    regressions = []
+    print(f"\n📈 Comparison against {baseline_path} (threshold {threshold:.2f}x)")
+    for result in results:
+        old = previous.get((result['graph'], result['benchmark']))
+        if not old or not old['median_ms']:
+            continue
+        ratio = result['median_ms'] / old['median_ms']
+        result['baseline_median_ms'] = old['median_ms']
+        result['ratio'] = round(ratio, 3)
+        marker = ''
+        if min(result['runs'], old.get('runs', 0)) < min_runs:
+            marker = '  (too few runs to judge)'
+        elif ratio > threshold:
+            marker = '  ❌ regression'
+            regressions.append(result)
+        elif ratio < 1 / threshold:
+            marker = '  ✅ faster'
+        print(f"  {result['graph']:<16} {result['benchmark']:<40} {old['median_ms']:>10.3f} -> {result['median_ms']:>10.3f} ms  {ratio:5.2f}x{marker}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="SHEild-X routing benchmarks")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000],
+                        help="Target edge counts for synthetic graphs (10k-1M)")
+    parser.add_argument('--kinds', nargs='+', default=['grid', 'random'], choices=sorted(GENERATORS),
+                        help="Synthetic network generators to run")
+    parser.add_argument('--saved', nargs='*', default=[],
+                        help="Saved .pkl graphs to benchmark as well")
+    parser.add_argument('--queries', type=int, default=20, help="Queries per snapping/routing benchmark")
+    parser.add_argument('--pipeline-runs', type=int, default=3,
+                        help="Repetitions of the RiskCalculator pipeline and compaction per graph")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skip-endpoint', action='store_true', help="Skip Flask round-trip benchmarks")
+    parser.add_argument('--output', help="Write results to this JSON file")
+    parser.add_argument('--compare', help="Previous results JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help="Median slowdown ratio counted as a regression")
+    parser.add_argument('--min-runs', type=int, default=3,
+                        help="Samples a benchmark needs before it can be flagged as a regression")
+    parser.add_argument('--fail-on-regression', action='store_true')
+    parser.add_argument('--verbose', action='store_true', help="Show the models' progress output")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    saved = [os.path.abspath(path) for path in args.saved]
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.compare) if args.compare else None
+
+    results = []
+    # The models write sample data relative to the working directory
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            for kind in args.kinds:
+                for size in args.sizes:
+                    graph = GENERATORS[kind](size, seed=args.seed)
+                    results.extend(run_graph(graph, f"{kind}-{size}", args))
+                    del graph
+            for path in saved:
+                graph = load_saved_graph(path)
+                label = os.path.basename(path).replace('.pkl', '')
+                results.extend(run_graph(graph, label, args))
+                del graph
+        finally:
+            os.chdir(cwd)
+
+    regressions = compare(results, baseline, args.threshold, args.min_runs) if baseline else []
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'queries': args.queries,
+        },
+        'results': results,
+    }
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results written to {output}")
+
+    if regressions and args.fail_on_regression:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
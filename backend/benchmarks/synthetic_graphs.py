@@ -0,0 +1,134 @@
+import math
+import pickle
+import random
+import networkx as nx
+
+# Centre synthetic networks on Coimbatore so the sample incidents and safe havens land on them
+CENTER_LAT = 11.0168
+CENTER_LON = 76.9558
+BLOCK_METERS = 120
+
+HIGHWAY_WEIGHTS = [
+    ('primary', 0.08),
+    ('secondary', 0.12),
+    ('tertiary', 0.15),
+    ('residential', 0.45),
+    ('service', 0.12),
+    ('unclassified', 0.08),
+]
+
+
+def _grid_side(target_edges):
+    """Grid side length whose two-way street grid has about target_edges edges"""
+    # An n x n grid has 2n(n-1) streets, each stored in both directions
+    return max(2, int(round((1 + math.sqrt(1 + target_edges)) / 2)))
+
+
+def _node_coords(i, j, side, jitter, rng):
+    meters_per_deg_lat = 111320
+    meters_per_deg_lon = 111320 * math.cos(math.radians(CENTER_LAT))
+    offset = (side - 1) * BLOCK_METERS / 2
+    dy = i * BLOCK_METERS - offset
+    dx = j * BLOCK_METERS - offset
+    if jitter:
+        dy += rng.uniform(-jitter, jitter)
+        dx += rng.uniform(-jitter, jitter)
+    return CENTER_LAT + dy / meters_per_deg_lat, CENTER_LON + dx / meters_per_deg_lon
+
+
+def _distance(graph, u, v):
+    lat_diff = (graph.nodes[u]['y'] - graph.nodes[v]['y']) * 111320
+    lon_diff = (graph.nodes[u]['x'] - graph.nodes[v]['x']) * 111320 * math.cos(math.radians(CENTER_LAT))
+    return math.sqrt(lat_diff ** 2 + lon_diff ** 2)
+
+
+def _add_street(graph, u, v, rng, osmid, oneway=False):
+    road_types, weights = zip(*HIGHWAY_WEIGHTS)
+    highway = rng.choices(road_types, weights)[0]
+    name = f"Street {osmid % 997}" if rng.random() < 0.85 else None
+    data = {
+        'osmid': osmid,
+        'highway': highway,
+        'oneway': oneway,
+        'reversed': False,
+        'length': round(_distance(graph, u, v), 3),
+    }
+    if name:
+        data['name'] = name
+    graph.add_edge(u, v, **data)
+    if not oneway:
+        graph.add_edge(v, u, **dict(data, reversed=True))
+
+
+def _empty_graph(name):
+    return nx.MultiDiGraph(name=name, crs='epsg:4326', simplified=True)
+
+
+def make_grid_graph(target_edges, seed=0):
+    """Regular street grid with osmnx-style node and edge attributes"""
+    rng = random.Random(seed)
+    side = _grid_side(target_edges)
+    graph = _empty_graph(f"grid-{target_edges}")
+
+    for i in range(side):
+        for j in range(side):
+            y, x = _node_coords(i, j, side, 0, rng)
+            graph.add_node(i * side + j, y=y, x=x, street_count=4)
+
+    osmid = 0
+    for i in range(side):
+        for j in range(side):
+            node = i * side + j
+            if j + 1 < side:
+                _add_street(graph, node, node + 1, rng, osmid)
+                osmid += 1
+            if i + 1 < side:
+                _add_street(graph, node, node + side, rng, osmid)
+                osmid += 1
+    return graph
+
+
+def make_random_graph(target_edges, seed=0):
+    """Irregular network: jittered grid with missing streets, diagonals and one-ways"""
+    rng = random.Random(seed)
+    side = _grid_side(target_edges)
+    graph = _empty_graph(f"random-{target_edges}")
+
+    for i in range(side):
+        for j in range(side):
+            y, x = _node_coords(i, j, side, BLOCK_METERS * 0.3, rng)
+            graph.add_node(i * side + j, y=y, x=x, street_count=3)
+
+    osmid = 0
+    for i in range(side):
+        for j in range(side):
+            node = i * side + j
+            neighbours = []
+            if j + 1 < side:
+                neighbours.append(node + 1)
+            if i + 1 < side:
+                neighbours.append(node + side)
+            if i + 1 < side and j + 1 < side and rng.random() < 0.1:
+                neighbours.append(node + side + 1)
+            for other in neighbours:
+                if rng.random() < 0.1:
+                    continue
+                oneway = rng.random() < 0.15
+                if oneway and rng.random() < 0.5:
+                    _add_street(graph, other, node, rng, osmid, oneway=True)
+                else:
+                    _add_street(graph, node, other, rng, osmid, oneway=oneway)
+                osmid += 1
+    return graph
+
+
+def load_saved_graph(path):
+    """Load a graph saved by /api/download-location"""
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+GENERATORS = {
+    'grid': make_grid_graph,
+    'random': make_random_graph,
+}
@@ -0,0 +1,167 @@
+import math
+import sys
+import numpy as np
+
+
+class CompactNetwork:
+    """Read-only road network stored in flat arrays (CSR adjacency)"""
+
+    def __init__(self, node_ids, lat, lon, node_risk, indptr, indices,
+                 edge_risk, edge_length, edge_name, names):
+        self.node_ids = node_ids          # int64, sorted OSM ids
+        self.lat = lat                    # float32
+        self.lon = lon                    # float32
+        self.node_risk = node_risk        # float32
+        self.indptr = indptr              # int32, len(nodes) + 1
+        self.indices = indices            # int32, edge targets
+        self.edge_risk = edge_risk        # float32
+        self.edge_length = edge_length    # float32, NaN when missing
+        self.edge_name = edge_name        # int32 into names, -1 when unnamed
+        self.names = names                # interned road names
+
+    @classmethod
+    def from_graph(cls, graph):
+        """Build from a prepared osmnx MultiDiGraph"""
+        node_ids = np.array(sorted(graph.nodes), dtype=np.int64)
+        position = {node: i for i, node in enumerate(node_ids.tolist())}
+        n = len(node_ids)
+
+        lat = np.empty(n, dtype=np.float32)
+        lon = np.empty(n, dtype=np.float32)
+        node_risk = np.empty(n, dtype=np.float32)
+        for node, data in graph.nodes(data=True):
+            i = position[node]
+            lat[i] = data.get('y', np.nan)
+            lon[i] = data.get('x', np.nan)
+            node_risk[i] = data.get('risk', 0.5)
+
+        m = graph.number_of_edges()
+        indptr = np.zeros(n + 1, dtype=np.int32)
+        indices = np.empty(m, dtype=np.int32)
+        edge_risk = np.empty(m, dtype=np.float32)
+        edge_length = np.empty(m, dtype=np.float32)
+        edge_name = np.empty(m, dtype=np.int32)
+        names = []
+        name_index = {}
+
+        e = 0
+        for i, node in enumerate(node_ids.tolist()):
+            # Adjacency order keeps parallel edges in key order, so the first match is the first key
+            for neighbor, keydict in graph.adj[node].items():
+                for data in keydict.values():
+                    indices[e] = position[neighbor]
+                    edge_risk[e] = data.get('risk', 0.5)
+                    edge_length[e] = data.get('length', np.nan)
+                    name = data.get('name')
+                    if isinstance(name, list):
+                        name = name[0] if name else None
+                    if name:
+                        name = str(name)
+                        if name not in name_index:
+                            name_index[name] = len(names)
+                            names.append(sys.intern(name))
+                        edge_name[e] = name_index[name]
+                    else:
+                        edge_name[e] = -1
+                    e += 1
+            indptr[i + 1] = e
+
+        return cls(node_ids, lat, lon, node_risk, indptr, indices[:e],
+                   edge_risk[:e], edge_length[:e], edge_name[:e], names)
+
+    def save(self, path):
+        """Write the arrays to an .npz file"""
+        np.savez(path, node_ids=self.node_ids, lat=self.lat, lon=self.lon,
+                 node_risk=self.node_risk, indptr=self.indptr, indices=self.indices,
+                 edge_risk=self.edge_risk, edge_length=self.edge_length,
+                 edge_name=self.edge_name, names=np.array(self.names, dtype=str))
+
+    @classmethod
+    def load(cls, path):
+        """Read a network written by save()"""
+        with np.load(path) as data:
+            names = [sys.intern(str(name)) for name in data['names']]
+            return cls(data['node_ids'], data['lat'], data['lon'], data['node_risk'],
+                       data['indptr'], data['indices'], data['edge_risk'],
+                       data['edge_length'], data['edge_name'], names)
+
+    @property
+    def num_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self):
+        return len(self.indices)
+
+    def index_of(self, node):
+        """Array index of an OSM node id, or None"""
+        i = int(np.searchsorted(self.node_ids, node))
+        if i < len(self.node_ids) and self.node_ids[i] == node:
+            return i
+        return None
+
+    def nearest_index(self, lat, lon):
+        """Index of the node closest to the given coordinates"""
+        if self.num_nodes == 0:
+            return None
+        lat_diff = (lat - self.lat) * 111320
+        lon_diff = (lon - self.lon) * (111320 * math.cos(math.radians(lat)))
+        dist = lat_diff * lat_diff + lon_diff * lon_diff
+        if np.isnan(dist).all():
+            return None
+        return int(np.nanargmin(dist))
+
+    def nearest_node(self, lat, lon):
+        """OSM id of the node closest to the given coordinates"""
+        index = self.nearest_index(lat, lon)
+        return int(self.node_ids[index]) if index is not None else None
+
+    def edge_between(self, u, v, weights=None):
+        """Position of an edge u -> v (by index), or None.
+
+        With per-edge weights, the cheapest of any parallel edges, as a search would take.
+        """
+        start, end = self.indptr[u], self.indptr[u + 1]
+        hits = np.flatnonzero(self.indices[start:end] == v)
+        if not len(hits):
+            return None
+        if weights is not None and len(hits) > 1:
+            return int(start + hits[np.argmin(weights[start + hits])])
+        return int(start + hits[0])
+
+    def reverse_csr(self):
+        """Transposed adjacency (indptr, indices, edge positions), built once on demand"""
+        if getattr(self, '_reverse', None) is None:
+            sources = np.repeat(np.arange(self.num_nodes, dtype=np.int32), np.diff(self.indptr))
+            order = np.argsort(self.indices, kind='stable').astype(np.int32)
+            indptr = np.zeros(self.num_nodes + 1, dtype=np.int32)
+            np.cumsum(np.bincount(self.indices, minlength=self.num_nodes), out=indptr[1:])
+            self._reverse = (indptr, sources[order], order)
+        return self._reverse
+
+    def road_name(self, edge):
+        name_id = self.edge_name[edge]
+        return self.names[name_id] if name_id >= 0 else None
+
+    def memory_report(self):
+        """Bytes held by each array plus the interned names"""
+        arrays = {
+            'node_ids': self.node_ids,
+            'lat': self.lat,
+            'lon': self.lon,
+            'node_risk': self.node_risk,
+            'indptr': self.indptr,
+            'indices': self.indices,
+            'edge_risk': self.edge_risk,
+            'edge_length': self.edge_length,
+            'edge_name': self.edge_name,
+        }
+        report = {name: int(array.nbytes) for name, array in arrays.items()}
+        report['names'] = sys.getsizeof(self.names) + sum(sys.getsizeof(n) for n in self.names)
+        return {
+            'nodes': self.num_nodes,
+            'edges': self.num_edges,
+            'road_names': len(self.names),
+            'bytes': report,
+            'total_bytes': sum(report.values())
+        }
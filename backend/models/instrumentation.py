@@ -0,0 +1,312 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+# Shortest sampling interval the profiler accepts, in seconds
+MIN_PROFILER_INTERVAL = 0.001
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+COUNT_BUCKETS = [10, 100, 1000, 10000, 100000, 1000000]
+
+
+def process_rss_bytes():
+    """Current resident set size of this process, or None if unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = list(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        """Record a single observation"""
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.bucket_counts[index] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def to_dict(self):
+        """Summary with cumulative bucket counts"""
+        cumulative = []
+        running = 0
+        for bound, n in zip(self.buckets + ['+Inf'], self.bucket_counts):
+            running += n
+            cumulative.append({'le': bound, 'count': running})
+        return {
+            'count': self.count,
+            'sum': round(self.total, 3),
+            'mean': round(self.total / self.count, 3) if self.count else 0,
+            'min': self.min,
+            'max': self.max,
+            'buckets': cumulative
+        }
+
+
+class Metrics:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Drop all recorded values"""
+        with self._lock:
+            self.histograms = {}
+            self.counters = {}
+            self.gauges = {}
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS_MS):
+        """Record a value into the named histogram"""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(buckets)
+            histogram.observe(value)
+
+    def increment(self, name, amount=1):
+        """Increase a counter"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_gauge(self, name, value):
+        """Set a gauge to the given value"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.gauges[name] = value
+
+    @contextmanager
+    def timer(self, name):
+        """Time the enclosed block into a millisecond histogram"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000)
+
+    def drain(self):
+        """Hand over histograms and counters recorded so far, then reset them; gauges are copied"""
+        with self._lock:
+            data = {
+                'histograms': {
+                    name: (h.buckets, h.bucket_counts, h.count, h.total, h.min, h.max)
+                    for name, h in self.histograms.items()
+                },
+                'counters': self.counters,
+                'gauges': dict(self.gauges)
+            }
+            self.histograms = {}
+            self.counters = {}
+        return data
+
+    def merge(self, data):
+        """Add histograms and counters drained from another process; gauges are left to the caller"""
+        if not self.enabled:
+            return
+        with self._lock:
+            for name, (buckets, bucket_counts, count, total, low, high) in data['histograms'].items():
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    histogram = self.histograms[name] = Histogram(buckets)
+                if histogram.buckets != list(buckets):
+                    continue
+                histogram.bucket_counts = [a + b for a, b in zip(histogram.bucket_counts, bucket_counts)]
+                histogram.count += count
+                histogram.total += total
+                if low is not None:
+                    histogram.min = low if histogram.min is None else min(histogram.min, low)
+                    histogram.max = high if histogram.max is None else max(histogram.max, high)
+            for name, value in data['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def after_fork(self):
+        """Fresh lock and empty values in a forked worker"""
+        self._lock = threading.Lock()
+        self.reset()
+
+    def snapshot(self):
+        """JSON-friendly view of every metric"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'histograms': {name: h.to_dict() for name, h in self.histograms.items()},
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges)
+            }
+
+    def to_prometheus(self):
+        """Render metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE sheildx_{name} counter")
+                lines.append(f"sheildx_{name} {value}")
+            for name, value in sorted(self.gauges.items()):
+                lines.append(f"# TYPE sheildx_{name} gauge")
+                lines.append(f"sheildx_{name} {value}")
+            for name, histogram in sorted(self.histograms.items()):
+                lines.append(f"# TYPE sheildx_{name} histogram")
+                running = 0
+                for bound, n in zip(histogram.buckets + ['+Inf'], histogram.bucket_counts):
+                    running += n
+                    lines.append(f'sheildx_{name}_bucket{{le="{bound}"}} {running}')
+                lines.append(f"sheildx_{name}_sum {histogram.total}")
+                lines.append(f"sheildx_{name}_count {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    def __init__(self, interval=0.005, max_depth=40):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._active_threads = Counter()
+        self._thread = None
+        self._stop = threading.Event()
+        self.reset()
+
+    def reset(self):
+        """Drop all collected samples"""
+        with self._lock:
+            self.samples = 0
+            self.leaf_counts = Counter()
+            self.inclusive_counts = Counter()
+            self.stack_counts = Counter()
+
+    def enable(self, interval=None):
+        """Start the background sampling thread"""
+        if interval is not None:
+            if not interval >= MIN_PROFILER_INTERVAL:
+                raise ValueError(f"interval must be at least {MIN_PROFILER_INTERVAL * 1000:.0f}ms")
+            self.interval = interval
+        if self.enabled:
+            return
+        self.enabled = True
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sheildx-profiler", daemon=True)
+        self._thread.start()
+        print(f"🔬 Sampling profiler enabled ({self.interval * 1000:.1f}ms interval)")
+
+    def disable(self):
+        """Stop sampling, keeping collected samples"""
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        print("🔬 Sampling profiler disabled")
+
+    def after_fork(self):
+        """The sampling thread does not survive fork; start over disabled"""
+        self._lock = threading.Lock()
+        self._active_threads = Counter()
+        self._thread = None
+        self._stop = threading.Event()
+        self.enabled = False
+        self.reset()
+
+    def profile(self):
+        """Mark the calling thread as sampled for the enclosed block"""
+        if not self.enabled:
+            return nullcontext()
+        return self._profile()
+
+    @contextmanager
+    def _profile(self):
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._active_threads[thread_id] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active_threads[thread_id] -= 1
+                if self._active_threads[thread_id] <= 0:
+                    del self._active_threads[thread_id]
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                active = list(self._active_threads)
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for thread_id in active:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self._record(frame)
+
+    def _record(self, frame):
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+            frame = frame.f_back
+        if not stack:
+            return
+        with self._lock:
+            self.samples += 1
+            self.leaf_counts[stack[0]] += 1
+            for entry in set(stack):
+                self.inclusive_counts[entry] += 1
+            self.stack_counts[tuple(reversed(stack))] += 1
+
+    def report(self, limit=20):
+        """Most frequently sampled functions and stacks"""
+        with self._lock:
+            samples = self.samples
+
+            def ranked(counter):
+                return [
+                    {'frame': key, 'samples': n, 'percent': round(100 * n / samples, 1)}
+                    for key, n in counter.most_common(limit)
+                ]
+
+            return {
+                'enabled': self.enabled,
+                'interval_ms': self.interval * 1000,
+                'samples': samples,
+                'self': ranked(self.leaf_counts) if samples else [],
+                'inclusive': ranked(self.inclusive_counts) if samples else [],
+                'stacks': [
+                    {'stack': list(stack), 'samples': n}
+                    for stack, n in self.stack_counts.most_common(limit)
+                ]
+            }
+
+
+# Shared instances used by the models and the Flask app
+metrics = Metrics(enabled=os.environ.get('SHEILDX_METRICS', '1') != '0')
+profiler = SamplingProfiler()
+
+if os.environ.get('SHEILDX_PROFILE') == '1':
+    profiler.enable()
@@ -0,0 +1,609 @@
+import heapq
+import json
+import math
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+from models.compact_network import CompactNetwork
+from models.instrumentation import metrics, COUNT_BUCKETS
+from models.path_finder import PathFinder, dijkstra, edge_weights, unwind
+
+MANIFEST = 'manifest.json'
+OVERLAY = 'overlay.npz'
+NODE_INDEX = 'node_index.npz'
+# Bumped whenever the on-disk layout changes
+FORMAT = 4
+# Successor hops around a cell that its risk pipeline sees. Two propagate_risk
+# iterations read the out-edges of nodes up to two hops past each edge.
+HALO_HOPS = 3
+
+
+def _edge_name(data):
+    name = data.get('name')
+    if isinstance(name, list):
+        name = name[0] if name else None
+    return str(name) if name else ''
+
+
+def scale_risk(risk, multiplier):
+    """Risk array scaled by a time-of-day multiplier, capped at 1 like RiskCalculator.apply_time_factor"""
+    return np.minimum(risk.astype(np.float64) * multiplier, 1.0).astype(np.float32)
+
+
+def _cell_shortcuts(network, weights, border):
+    """Shortcuts between a cell's boundary nodes as (src, dst, weight) arrays sorted by src.
+
+    A shortcut whose shortest path passes another boundary node is left out: the
+    shortcuts on either side of that node already give the same cost.
+    """
+    border = sorted(border)
+    border_set = set(border)
+    src, dst, weight = [], [], []
+    for b in border:
+        settled, pred = dijkstra(network.indptr, network.indices, weights, {b: 0.0}, border_set)
+        # Settle order puts every predecessor first
+        via_border = {}
+        for v in settled:
+            p = pred[v]
+            via_border[v] = p != -1 and (via_border[p] or (p in border_set and p != b))
+        for c in border:
+            if c != b and c in settled and not via_border[c]:
+                src.append(b)
+                dst.append(c)
+                weight.append(settled[c])
+    return (network.node_ids[np.array(src, dtype=np.int64)], network.node_ids[np.array(dst, dtype=np.int64)],
+            np.array(weight, dtype=np.float32))
+
+
+def build_partitions(graph, out_dir, cell_size_m=5000, prepare=None, risk_multipliers=(1.0,)):
+    """Split a road graph into square cells on disk, plus the boundary overlay that joins them.
+
+    The build is written to a hidden directory beside out_dir and swapped in once complete.
+    The build it replaces is kept as .<name>.previous until the next one, so networks still
+    serving it keep reading consistent files.
+    """
+    out_dir = os.path.normpath(out_dir)
+    parent, base = os.path.split(out_dir)
+    building = os.path.join(parent, f".{base}.building-{os.getpid()}")
+    previous = os.path.join(parent, f".{base}.previous")
+    shutil.rmtree(building, ignore_errors=True)
+    try:
+        manifest = _write_partitions(graph, building, cell_size_m, prepare, risk_multipliers)
+    except BaseException:
+        shutil.rmtree(building, ignore_errors=True)
+        raise
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(out_dir):
+        os.replace(out_dir, previous)
+    os.replace(building, out_dir)
+    return manifest
+
+
+def _write_partitions(graph, out_dir, cell_size_m, prepare, risk_multipliers):
+    """Write every file of a partitioned build into out_dir.
+
+    Each cell is prepared separately by `prepare(subgraph)` together with a halo deep
+    enough for risk propagation, so the whole region never has to carry risk attributes
+    at once. `prepare` must leave out the time factor: shortcuts are computed for each of
+    `risk_multipliers`, and one of them is applied when the partitions are opened.
+    """
+    risk_multipliers = sorted(set(float(m) for m in risk_multipliers))
+    start = time.perf_counter()
+    lats = [data['y'] for _, data in graph.nodes(data=True)]
+    lons = [data['x'] for _, data in graph.nodes(data=True)]
+    origin_lat, origin_lon = min(lats), min(lons)
+    lon_scale = 111320 * math.cos(math.radians((min(lats) + max(lats)) / 2))
+
+    cells = {}
+    for node, data in graph.nodes(data=True):
+        i = int((data['y'] - origin_lat) * 111320 // cell_size_m)
+        j = int((data['x'] - origin_lon) * lon_scale // cell_size_m)
+        cells.setdefault(f"{i}_{j}", []).append(node)
+    keys = sorted(cells)
+    node_part = {node: pid for pid, key in enumerate(keys) for node in cells[key]}
+
+    boundary = {pid: set() for pid in range(len(keys))}
+    for u, v in graph.edges():
+        if node_part[u] != node_part[v]:
+            boundary[node_part[u]].add(u)
+            boundary[node_part[v]].add(v)
+
+    os.makedirs(out_dir, exist_ok=True)
+    cut = {'u': [], 'v': [], 'risk': [], 'length': [], 'name': []}
+    partitions = []
+    total_edges = 0
+    total_shortcuts = 0
+
+    for pid, key in enumerate(keys):
+        members = set(cells[key])
+        halo, frontier = set(members), members
+        for _ in range(HALO_HOPS):
+            frontier = {v for u in frontier for v in graph.successors(u)} - halo
+            halo |= frontier
+        sub = graph.subgraph(halo).copy()
+        if prepare is not None:
+            prepare(sub)
+
+        network = CompactNetwork.from_graph(sub.subgraph(members))
+        filename = f"part_{key}.npz"
+        network.save(os.path.join(out_dir, filename))
+        total_edges += network.num_edges
+
+        # Edges leaving the cell keep the risk prepared on this side
+        for u in members:
+            for v, keydict in sub.adj[u].items():
+                if v in members:
+                    continue
+                for data in keydict.values():
+                    cut['u'].append(u)
+                    cut['v'].append(v)
+                    cut['risk'].append(data.get('risk', 0.5))
+                    cut['length'].append(data.get('length', np.nan))
+                    cut['name'].append(_edge_name(data))
+
+        # Shortcuts stay on disk next to the cell and are loaded when a search reaches it.
+        # Scaling risk changes which paths are safest, so each multiplier gets its own set.
+        border = [network.index_of(node) for node in boundary[pid]]
+        shortcuts = {}
+        for level, multiplier in enumerate(risk_multipliers):
+            weights = edge_weights(scale_risk(network.edge_risk, multiplier), network.edge_length)
+            src, dst, weight = _cell_shortcuts(network, weights, border)
+            shortcuts.update({f'src_{level}': src, f'dst_{level}': dst, f'weight_{level}': weight})
+        shortcuts_file = f"shortcuts_{key}.npz"
+        np.savez(os.path.join(out_dir, shortcuts_file), **shortcuts)
+        shortcut_count = max(len(array) for name, array in shortcuts.items() if name.startswith('src_'))
+        total_shortcuts += shortcut_count
+
+        partitions.append({
+            'key': key,
+            'file': filename,
+            'shortcuts_file': shortcuts_file,
+            'nodes': network.num_nodes,
+            'edges': network.num_edges,
+            'boundary_nodes': len(border),
+            'shortcuts': shortcut_count,
+            'bbox': [float(network.lat.min()), float(network.lon.min()),
+                     float(network.lat.max()), float(network.lon.max())]
+        })
+        print(f"  Partition {key}: {network.num_nodes} nodes, {len(border)} boundary nodes, {shortcut_count} shortcuts")
+        del sub, network
+
+    # Cut edges sorted by (u, v), with road names interned into a table
+    cut_u = np.array(cut['u'], dtype=np.int64)
+    cut_v = np.array(cut['v'], dtype=np.int64)
+    order = np.lexsort((cut_v, cut_u))
+    names = sorted(set(cut['name']) - {''})
+    name_index = {name: i for i, name in enumerate(names)}
+    np.savez(
+        os.path.join(out_dir, OVERLAY),
+        u=cut_u[order],
+        v=cut_v[order],
+        risk=np.array(cut['risk'], dtype=np.float32)[order],
+        length=np.array(cut['length'], dtype=np.float32)[order],
+        name=np.array([name_index.get(name, -1) for name in cut['name']], dtype=np.int32)[order],
+        names=np.array(names, dtype=str)
+    )
+
+    node_ids = np.array(sorted(node_part), dtype=np.int64)
+    np.savez(os.path.join(out_dir, NODE_INDEX), node_ids=node_ids,
+             part=np.array([node_part[node] for node in node_ids.tolist()], dtype=np.int32))
+
+    manifest = {
+        'format': FORMAT,
+        'cell_size_m': cell_size_m,
+        'risk_multipliers': risk_multipliers,
+        'origin': [origin_lat, origin_lon],
+        'lon_scale': lon_scale,
+        'nodes': len(node_ids),
+        'edges': total_edges + len(cut['u']),
+        'cut_edges': len(cut['u']),
+        'shortcuts': total_shortcuts,
+        'overlay_edges': total_shortcuts + len(cut['u']),
+        'partitions': partitions,
+        'build_time': datetime.now().isoformat(),
+        'build_seconds': round(time.perf_counter() - start, 1)
+    }
+    with open(os.path.join(out_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"✅ Built {len(partitions)} partitions with {manifest['overlay_edges']} overlay edges in {manifest['build_seconds']}s")
+    return manifest
+
+
+def is_partition_dir(path):
+    # Builds in progress and replaced builds are hidden
+    if os.path.basename(os.path.normpath(path)).startswith('.'):
+        return False
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, MANIFEST))
+
+
+class PartitionedNetwork:
+    """Road network kept on disk as cells; only the node index and cut edges stay resident"""
+
+    def __init__(self, directory, max_resident=8, max_shortcut_blocks=256, risk_multiplier=1.0):
+        self.directory = directory
+        self.max_resident = max_resident
+        self.max_shortcut_blocks = max_shortcut_blocks
+        # Files are opened through this handle, so a rebuild swapped in later is never mixed in
+        self._dir_fd = os.open(directory, os.O_RDONLY)
+        with self._open(MANIFEST) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format') != FORMAT:
+            raise ValueError(f"{directory} was built by an older version; partition the location again")
+        self.partitions = self.manifest['partitions']
+
+        # Stored risks are scaled by the multiplier when read; shortcuts come precomputed for it
+        levels = [i for i, m in enumerate(self.manifest['risk_multipliers']) if math.isclose(m, risk_multiplier)]
+        if not levels:
+            raise ValueError(f"{directory} has no shortcuts for risk multiplier {risk_multiplier}; "
+                             f"built for {self.manifest['risk_multipliers']}")
+        self.risk_multiplier = risk_multiplier
+        self.risk_level = levels[0]
+
+        with self._open(NODE_INDEX) as f, np.load(f) as data:
+            self.node_ids = data['node_ids']
+            self.node_part = data['part']
+
+        # Cut edges sorted by (u, v); the same arrays are the overlay's CSR adjacency
+        with self._open(OVERLAY) as f, np.load(f) as data:
+            self.cut_u = data['u']
+            self.cut_v = data['v']
+            self.cut_risk = scale_risk(data['risk'], risk_multiplier)
+            self.cut_length = data['length']
+            self.cut_name = data['name']
+            self.cut_names = [sys.intern(str(name)) for name in data['names']]
+        self.cut_weights = edge_weights(self.cut_risk, self.cut_length)
+        self.cut_risk_cumsum = np.concatenate([[0.0], np.cumsum(self.cut_risk, dtype=np.float64)])
+        self.overlay_ids = np.unique(np.concatenate([self.cut_u, self.cut_v]))
+        self.overlay_indptr = np.append(np.searchsorted(self.cut_u, self.overlay_ids),
+                                        len(self.cut_u)).astype(np.int32)
+        self.overlay_indices = np.searchsorted(self.overlay_ids, self.cut_v).astype(np.int32)
+        self.overlay_parts = self.node_part[np.searchsorted(self.node_ids, self.overlay_ids)]
+
+        # Boundary nodes of each partition, as overlay ids
+        self.boundary = {}
+        for node, pid in zip(self.overlay_ids.tolist(), self.overlay_parts.tolist()):
+            self.boundary.setdefault(pid, []).append(node)
+
+        self._resident = OrderedDict()
+        self._shortcuts = OrderedDict()
+        self._loading = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        print(f"✅ PartitionedNetwork opened with {len(self.partitions)} partitions, {len(self.overlay_ids)} boundary nodes, risk x{risk_multiplier}")
+
+    def _open(self, filename):
+        return open(filename, 'rb', opener=lambda path, flags: os.open(path, flags, dir_fd=self._dir_fd))
+
+    def __del__(self):
+        dir_fd = getattr(self, '_dir_fd', None)
+        if dir_fd is not None:
+            os.close(dir_fd)
+
+    @property
+    def num_nodes(self):
+        return self.manifest['nodes']
+
+    @property
+    def num_edges(self):
+        return self.manifest['edges']
+
+    def after_fork(self, workers=1):
+        """Fresh lock and load state in a forked worker, which gets an equal share of the caches"""
+        self._lock = threading.Lock()
+        self._loading = {}
+        self._local = threading.local()
+        self.max_resident = max(1, self.max_resident // workers)
+        self.max_shortcut_blocks = max(1, self.max_shortcut_blocks // workers)
+        # Cells the parent loaded stay shared with it; only count this worker's own
+        self._resident = OrderedDict()
+        self._shortcuts = OrderedDict()
+
+    @contextmanager
+    def pinned(self):
+        """Keep everything the calling thread loads inside the block until it ends, whatever the caches drop"""
+        if getattr(self._local, 'pins', None) is not None:
+            yield
+            return
+        self._local.pins = {}
+        try:
+            yield
+        finally:
+            self._local.pins = None
+
+    def _cached(self, cache, limit, pid, load, name):
+        """Entry for pid from an LRU cache, calling load(pid) on a miss.
+
+        Files are read outside the lock; a thread wanting an entry that is already
+        being read waits for that read instead of starting another.
+        """
+        key = (name, pid)
+        pins = getattr(self._local, 'pins', None)
+        if pins is not None and key in pins:
+            return pins[key]
+
+        entry = None
+        while entry is None:
+            with self._lock:
+                entry = cache.get(pid)
+                if entry is not None:
+                    cache.move_to_end(pid)
+                    break
+                loading = self._loading.get(key)
+                owner = loading is None
+                if owner:
+                    loading = self._loading[key] = threading.Event()
+            if not owner:
+                loading.wait()
+                continue
+            try:
+                with metrics.timer(f'{name}_load_ms'):
+                    entry = load(pid)
+                with self._lock:
+                    cache[pid] = entry
+                    while len(cache) > limit:
+                        cache.popitem(last=False)
+                    resident = len(cache)
+                metrics.increment(f'{name}_loads')
+                metrics.set_gauge(f'{name}s_resident', resident)
+            finally:
+                with self._lock:
+                    del self._loading[key]
+                loading.set()
+
+        if pins is not None:
+            pins[key] = entry
+        return entry
+
+    def partition(self, pid):
+        """(network, edge weights) of a partition, loading it from disk on first use"""
+        return self._cached(self._resident, self.max_resident, pid, self._load_partition, 'partition')
+
+    def _load_partition(self, pid):
+        with self._open(self.partitions[pid]['file']) as f:
+            network = CompactNetwork.load(f)
+        network.edge_risk = scale_risk(network.edge_risk, self.risk_multiplier)
+        network.node_risk = self._node_risk(network)
+        return network, edge_weights(network.edge_risk, network.edge_length)
+
+    def _node_risk(self, network):
+        """Mean risk of each node's outgoing edges, cut edges included, as calculate_node_risk gives it"""
+        counts = np.diff(network.indptr)
+        sums = np.bincount(np.repeat(np.arange(network.num_nodes), counts),
+                           weights=network.edge_risk, minlength=network.num_nodes)
+        left = np.searchsorted(self.cut_u, network.node_ids, side='left')
+        right = np.searchsorted(self.cut_u, network.node_ids, side='right')
+        sums += self.cut_risk_cumsum[right] - self.cut_risk_cumsum[left]
+        counts = counts + (right - left)
+        # Nodes without outgoing edges keep the stored default
+        return np.where(counts > 0, sums / np.maximum(counts, 1), network.node_risk).astype(np.float32)
+
+    def shortcuts(self, pid):
+        """(source ids, indptr, overlay targets, weights) of a partition's shortcuts, loading them on first use"""
+        return self._cached(self._shortcuts, self.max_shortcut_blocks, pid, self._load_shortcuts, 'shortcut_block')
+
+    def _load_shortcuts(self, pid):
+        with self._open(self.partitions[pid]['shortcuts_file']) as f, np.load(f) as data:
+            level = self.risk_level
+            src, dst, weight = data[f'src_{level}'], data[f'dst_{level}'], data[f'weight_{level}']
+        ids, starts = np.unique(src, return_index=True)
+        indptr = np.append(starts, len(src)).astype(np.int32)
+        return ids, indptr, np.searchsorted(self.overlay_ids, dst).astype(np.int32), weight
+
+    def part_of(self, node):
+        """Partition id holding an OSM node, or None"""
+        i = int(np.searchsorted(self.node_ids, node))
+        if i < len(self.node_ids) and self.node_ids[i] == node:
+            return int(self.node_part[i])
+        return None
+
+    def cut_edge(self, u, v):
+        """Position of the cheapest cut edge u -> v between OSM ids, or None"""
+        start = int(np.searchsorted(self.cut_u, u, side='left'))
+        end = int(np.searchsorted(self.cut_u, u, side='right'))
+        hits = np.flatnonzero(self.cut_v[start:end] == v)
+        if not len(hits):
+            return None
+        return int(start + hits[np.argmin(self.cut_weights[start + hits])])
+
+    def cut_road_name(self, edge):
+        name_id = self.cut_name[edge]
+        return self.cut_names[name_id] if name_id >= 0 else None
+
+    def nearest_node(self, lat, lon):
+        """OSM id of the closest node, loading only cells that could contain it"""
+        lon_scale = 111320 * math.cos(math.radians(lat))
+        candidates = []
+        for pid, info in enumerate(self.partitions):
+            min_lat, min_lon, max_lat, max_lon = info['bbox']
+            dy = max(min_lat - lat, 0, lat - max_lat) * 111320
+            dx = max(min_lon - lon, 0, lon - max_lon) * lon_scale
+            candidates.append((dy * dy + dx * dx, pid))
+        candidates.sort()
+
+        best, best_dist = None, float('inf')
+        for box_dist, pid in candidates:
+            if box_dist >= best_dist:
+                break
+            network, _ = self.partition(pid)
+            index = network.nearest_index(lat, lon)
+            if index is None:
+                continue
+            dy = (lat - float(network.lat[index])) * 111320
+            dx = (lon - float(network.lon[index])) * lon_scale
+            if dy * dy + dx * dx < best_dist:
+                best, best_dist = int(network.node_ids[index]), dy * dy + dx * dx
+        return best
+
+    def memory_report(self):
+        """Bytes held by the always-resident index and overlay plus the cells and shortcuts loaded right now"""
+        with self._lock:
+            resident = {self.partitions[pid]['key']: network.memory_report()['total_bytes']
+                        for pid, (network, _) in self._resident.items()}
+            shortcut_bytes = sum(sum(array.nbytes for array in block) for block in self._shortcuts.values())
+        cut_arrays = [self.cut_u, self.cut_v, self.cut_risk, self.cut_length, self.cut_name, self.cut_risk_cumsum]
+        report = {
+            'node_index': int(self.node_ids.nbytes + self.node_part.nbytes),
+            'overlay': int(self.overlay_ids.nbytes + self.overlay_indptr.nbytes + self.overlay_indices.nbytes
+                           + self.cut_weights.nbytes + self.overlay_parts.nbytes),
+            'cut_edges': int(sum(array.nbytes for array in cut_arrays)) + sys.getsizeof(self.cut_names)
+                         + sum(sys.getsizeof(name) for name in self.cut_names),
+            'resident_partitions': sum(resident.values()),
+            'resident_shortcuts': int(shortcut_bytes)
+        }
+        return {
+            'nodes': self.num_nodes,
+            'edges': self.num_edges,
+            'partitions': len(self.partitions),
+            'resident': resident,
+            'bytes': report,
+            'total_bytes': sum(report.values())
+        }
+
+
+class PartitionedPathFinder(PathFinder):
+    """Routes across partitions: search the end cells, then the boundary overlay in between"""
+
+    def __init__(self, network):
+        self.network = network
+        self.route_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        print(f"✅ PartitionedPathFinder initialized with {network.num_nodes} nodes")
+
+    def pinned(self):
+        return self.network.pinned()
+
+    def _has_node(self, node):
+        return self.network.part_of(node) is not None
+
+    def _search(self, source, target):
+        net = self.network
+        p, q = net.part_of(source), net.part_of(target)
+        source_net, source_weights = net.partition(p)
+        target_net, target_weights = net.partition(q)
+        s = source_net.index_of(source)
+        t = target_net.index_of(target)
+
+        # Forward from the source to its cell's border (and the target if it shares the cell)
+        exits = {source_net.index_of(b): b for b in net.boundary.get(p, [])}
+        goals = set(exits)
+        if p == q:
+            goals.add(t)
+        forward, forward_pred = dijkstra(source_net.indptr, source_net.indices, source_weights, {s: 0.0}, goals)
+
+        # Backward from the target to its cell's border
+        rev_indptr, rev_indices, rev_order = target_net.reverse_csr()
+        entries = {target_net.index_of(b): b for b in net.boundary.get(q, [])}
+        backward, backward_pred = dijkstra(rev_indptr, rev_indices, target_weights[rev_order], {t: 0.0}, set(entries))
+
+        best, best_end = float('inf'), None
+        if p == q and t in forward:
+            best, best_end = forward[t], 'direct'
+
+        overlay_index = lambda node: int(np.searchsorted(net.overlay_ids, node))
+        dist = {overlay_index(b): forward[i] for i, b in exits.items() if i in forward}
+        finish = {overlay_index(b): backward[i] for i, b in entries.items() if i in backward}
+        pred = {u: None for u in dist}
+        heap = [(d, u) for u, d in dist.items()]
+        heapq.heapify(heap)
+        done = set()
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in done:
+                continue
+            if d >= best:
+                break
+            done.add(u)
+            if u in finish and d + finish[u] < best:
+                best, best_end = d + finish[u], u
+            # Cut edges out of u, then the shortcuts across u's own cell
+            start, end = net.overlay_indptr[u], net.overlay_indptr[u + 1]
+            edges = [(net.overlay_indices[start:end], net.cut_weights[start:end], -1)]
+            part = int(net.overlay_parts[u])
+            ids, indptr, targets, weights = net.shortcuts(part)
+            i = int(np.searchsorted(ids, net.overlay_ids[u]))
+            if i < len(ids) and ids[i] == net.overlay_ids[u]:
+                edges.append((targets[indptr[i]:indptr[i + 1]], weights[indptr[i]:indptr[i + 1]], part))
+            for vs, ws, via in edges:
+                for v, w in zip(vs.tolist(), ws.tolist()):
+                    nd = d + w
+                    if nd < dist.get(v, float('inf')):
+                        dist[v] = nd
+                        pred[v] = (u, via)
+                        heapq.heappush(heap, (nd, v))
+
+        metrics.observe('search_nodes_settled', len(forward) + len(backward) + len(done), COUNT_BUCKETS)
+        if best_end is None:
+            return None
+        if best_end == 'direct':
+            return source_net.node_ids[unwind(forward_pred, t)].tolist()
+        return self._unpack(best_end, pred, source_net, forward_pred, target_net, backward_pred)
+
+    def _unpack(self, end, pred, source_net, forward_pred, target_net, backward_pred):
+        """Expand an overlay route into the full node sequence"""
+        chain, parts = [end], []
+        while pred[chain[-1]] is not None:
+            previous, part = pred[chain[-1]]
+            chain.append(previous)
+            parts.append(part)
+        chain.reverse()
+        parts.reverse()
+        hops = self.network.overlay_ids[chain].tolist()
+
+        path = source_net.node_ids[unwind(forward_pred, source_net.index_of(hops[0]))].tolist()
+        for a, b, part in zip(hops, hops[1:], parts):
+            if part == -1:
+                path.append(b)
+                continue
+            network, weights = self.network.partition(part)
+            ai, bi = network.index_of(a), network.index_of(b)
+            _, inner_pred = dijkstra(network.indptr, network.indices, weights, {ai: 0.0}, {bi})
+            path.extend(network.node_ids[unwind(inner_pred, bi)[1:]].tolist())
+
+        node = target_net.index_of(hops[-1])
+        tail = []
+        while backward_pred[node] != -1:
+            node = backward_pred[node]
+            tail.append(node)
+        path.extend(target_net.node_ids[tail].tolist())
+        return path
+
+    def route_hops(self, path):
+        hops = []
+        for i, (u, v) in enumerate(zip(path, path[1:])):
+            pu, pv = self.network.part_of(u), self.network.part_of(v)
+            if pu is None or pv is None:
+                continue
+            if pu != pv:
+                edge = self.network.cut_edge(u, v)
+                if edge is not None:
+                    hops.append((i, float(self.network.cut_risk[edge]),
+                                 float(self.network.cut_length[edge]), self.network.cut_road_name(edge)))
+                continue
+            network, weights = self.network.partition(pu)
+            edge = network.edge_between(network.index_of(u), network.index_of(v), weights)
+            if edge is not None:
+                hops.append((i, float(network.edge_risk[edge]),
+                             float(network.edge_length[edge]), network.road_name(edge)))
+        return hops
+
+    def _coordinates(self, node):
+        pid = self.network.part_of(node)
+        if pid is None:
+            return None
+        network, _ = self.network.partition(pid)
+        index = network.index_of(node)
+        return float(network.lat[index]), float(network.lon[index])
+
+
+def make_path_finder(network):
+    """Path finder matching the kind of network being served"""
+    if isinstance(network, PartitionedNetwork):
+        return PartitionedPathFinder(network)
+    return PathFinder(network)
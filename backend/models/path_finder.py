@@ -1,158 +1,199 @@
-import networkx as nx
+import heapq
 import math
+import threading
+import numpy as np
+from collections import OrderedDict
+from contextlib import nullcontext
+from models.instrumentation import metrics, profiler, COUNT_BUCKETS
+
+ROUTE_CACHE_SIZE = 256
+
+def edge_weights(risk, length):
+    """Safety-first cost per edge: risk dominates, distance breaks ties"""
+    return (risk * 1000 + np.nan_to_num(length, nan=100) * 0.1).astype(np.float32)
+
+def dijkstra(indptr, indices, weights, sources, targets=None):
+    """Dijkstra over CSR arrays from {index: start cost}, stopping once every target is settled.
+
+    Returns the settled costs and predecessors (-1 for sources).
+    """
+    dist = dict(sources)
+    pred = {u: -1 for u in sources}
+    settled = {}
+    heap = [(d, u) for u, d in sources.items()]
+    heapq.heapify(heap)
+    remaining = set(targets) if targets is not None else None
+
+    while heap:
+        d, u = heapq.heappop(heap)
+        if u in settled:
+            continue
+        settled[u] = d
+        if remaining is not None:
+            remaining.discard(u)
+            if not remaining:
+                break
+        start, end = indptr[u], indptr[u + 1]
+        for v, w in zip(indices[start:end].tolist(), weights[start:end].tolist()):
+            nd = d + w
+            if nd < dist.get(v, float('inf')):
+                dist[v] = nd
+                pred[v] = u
+                heapq.heappush(heap, (nd, v))
+
+    return settled, pred
+
+def unwind(pred, node):
+    """Follow predecessors back to a source, returning the path in order"""
+    path = [node]
+    while pred[path[-1]] != -1:
+        path.append(pred[path[-1]])
+    path.reverse()
+    return path
 
 class PathFinder:  # Make sure this class name matches
-    def __init__(self, graph):
-        self.graph = graph
-        print(f"✅ PathFinder initialized with {len(graph.nodes)} nodes")
-        
+    def __init__(self, network):
+        self.network = network
+        self.route_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.weights = edge_weights(network.edge_risk, network.edge_length)
+        print(f"✅ PathFinder initialized with {network.num_nodes} nodes")
+
     def find_nearest_node(self, lat, lon):
         """Find nearest node to given coordinates"""
-        min_dist = float('inf')
-        nearest_node = None
-        
-        for node in self.graph.nodes():
-            try:
-                node_lat = self.graph.nodes[node]['y']
-                node_lon = self.graph.nodes[node]['x']
-                
-                # Calculate Euclidean distance
-                lat_diff = (lat - node_lat) * 111320
-                lon_diff = (lon - node_lon) * 111320 * math.cos(math.radians(lat))
-                dist = math.sqrt(lat_diff**2 + lon_diff**2)
-                
-                if dist < min_dist:
-                    min_dist = dist
-                    nearest_node = node
-            except:
-                continue
-                
-        return nearest_node
-    
+        return self.network.nearest_node(lat, lon)
+
     def find_safest_route(self, source, target):
         """Find the safest path by minimizing risk"""
         try:
-            if source not in self.graph:
+            if not self._has_node(source):
                 print(f"Source node {source} not in graph")
                 return None
-            if target not in self.graph:
+            if not self._has_node(target):
                 print(f"Target node {target} not in graph")
                 return None
-            
-            def weight_function(u, v, d):
-                risk = d.get('risk', 0.5)
-                distance = d.get('length', 100)
-                return (risk * 1000) + (distance * 0.1)
-            
-            path = nx.shortest_path(self.graph, source, target, weight=weight_function)
+
+            with self._cache_lock:
+                cached = self.route_cache.get((source, target))
+                if cached is not None:
+                    self.route_cache.move_to_end((source, target))
+            if cached is not None:
+                metrics.increment('route_cache_hits')
+                return list(cached)
+            metrics.increment('route_cache_misses')
+
+            with profiler.profile():
+                path = self._search(source, target)
+
+            if path is None:
+                print(f"No path found between nodes")
+                return None
+
+            with self._cache_lock:
+                self.route_cache[(source, target)] = tuple(path)
+                if len(self.route_cache) > ROUTE_CACHE_SIZE:
+                    self.route_cache.popitem(last=False)
             return path
-            
-        except nx.NetworkXNoPath:
-            print(f"No path found between nodes")
-            return None
+
         except Exception as e:
             print(f"Error in find_safest_route: {e}")
             return None
-    
-    def calculate_path_risk(self, path):
+
+    def pinned(self):
+        """Keep whatever a route loads resident until the block ends; everything already is here"""
+        return nullcontext()
+
+    def _has_node(self, node):
+        return self.network.index_of(node) is not None
+
+    def _search(self, source, target):
+        """Shortest path over the CSR arrays, as OSM node ids"""
+        source_index = self.network.index_of(source)
+        target_index = self.network.index_of(target)
+        settled, pred = dijkstra(self.network.indptr, self.network.indices, self.weights,
+                                 {source_index: 0.0}, {target_index})
+        metrics.observe('search_nodes_settled', len(settled), COUNT_BUCKETS)
+        if target_index not in settled:
+            return None
+        return self.network.node_ids[unwind(pred, target_index)].tolist()
+
+    def route_hops(self, path):
+        """(position, risk, length, road name) for each hop of the path that has an edge"""
+        indices = [self.network.index_of(node) for node in path]
+        hops = []
+        for i, (u, v) in enumerate(zip(indices, indices[1:])):
+            if u is None or v is None:
+                continue
+            edge = self.network.edge_between(u, v, self.weights)
+            if edge is not None:
+                hops.append((i, float(self.network.edge_risk[edge]),
+                             float(self.network.edge_length[edge]), self.network.road_name(edge)))
+        return hops
+
+    def _coordinates(self, node):
+        index = self.network.index_of(node)
+        if index is None:
+            return None
+        return float(self.network.lat[index]), float(self.network.lon[index])
+
+    def calculate_path_risk(self, path, hops=None):
         """Calculate average risk of the path"""
         if not path or len(path) < 2:
             return 0.5
-        
-        total_risk = 0
-        count = 0
-        
-        for i in range(len(path)-1):
-            u, v = path[i], path[i+1]
-            if self.graph.has_edge(u, v):
-                try:
-                    edge_data = self.graph.get_edge_data(u, v)
-                    if edge_data:
-                        first_key = list(edge_data.keys())[0]
-                        risk = edge_data[first_key].get('risk', 0.5)
-                        total_risk += risk
-                        count += 1
-                except:
-                    continue
-        
-        return total_risk / count if count > 0 else 0.5
-    
-    def calculate_path_distance(self, path):
+
+        hops = self.route_hops(path) if hops is None else hops
+        if not hops:
+            return 0.5
+        return sum(risk for _, risk, _, _ in hops) / len(hops)
+
+    def calculate_path_distance(self, path, hops=None):
         """Calculate total distance of the path in meters"""
         if not path or len(path) < 2:
             return 0
-        
-        total_dist = 0
-        for i in range(len(path)-1):
-            u, v = path[i], path[i+1]
-            if self.graph.has_edge(u, v):
-                try:
-                    edge_data = self.graph.get_edge_data(u, v)
-                    if edge_data:
-                        first_key = list(edge_data.keys())[0]
-                        total_dist += edge_data[first_key].get('length', 100)
-                except:
-                    continue
-        
-        return total_dist
-    
+
+        hops = self.route_hops(path) if hops is None else hops
+        return sum(100 if math.isnan(length) else length for _, _, length, _ in hops)
+
     def path_to_coordinates(self, path):
         """Convert path nodes to list of coordinates"""
         if not path:
             return []
-        
+
         coordinates = []
         for node in path:
-            try:
-                if node in self.graph.nodes:
-                    coordinates.append({
-                        'lat': self.graph.nodes[node]['y'],
-                        'lon': self.graph.nodes[node]['x']
-                    })
-            except:
-                continue
-                
+            point = self._coordinates(node)
+            if point is not None:
+                coordinates.append({
+                    'lat': round(point[0], 6),
+                    'lon': round(point[1], 6)
+                })
+
         return coordinates
-    
-    def generate_route_instructions(self, path):
+
+    def generate_route_instructions(self, path, hops=None):
         """Generate simple turn-by-turn instructions"""
         if not path or len(path) < 2:
             return []
-        
+
         instructions = []
-        
-        for i in range(len(path) - 1):
-            current = path[i]
-            next_node = path[i + 1]
-            
-            if not self.graph.has_edge(current, next_node):
-                continue
-                
-            try:
-                edge_data = self.graph.get_edge_data(current, next_node)
-                first_key = list(edge_data.keys())[0]
-                data = edge_data[first_key]
-                
-                road_name = data.get('name', 'Unnamed road')
-                if isinstance(road_name, list):
-                    road_name = road_name[0] if road_name else 'Unnamed road'
-                
-                distance = data.get('length', 0)
-                
-                if i == 0:
-                    instruction = f"Start on {road_name}"
-                else:
-                    instruction = f"Continue on {road_name}"
-                
-                instructions.append({
-                    'step': i + 1,
-                    'instruction': instruction,
-                    'road': road_name,
-                    'distance': round(distance, 0)
-                })
-            except:
-                continue
-        
+        hops = self.route_hops(path) if hops is None else hops
+
+        for i, _, length, name in hops:
+            road_name = name or 'Unnamed road'
+            distance = 0 if math.isnan(length) else length
+
+            if i == 0:
+                instruction = f"Start on {road_name}"
+            else:
+                instruction = f"Continue on {road_name}"
+
+            instructions.append({
+                'step': i + 1,
+                'instruction': instruction,
+                'road': road_name,
+                'distance': round(distance, 0)
+            })
+
         if instructions:
             instructions.append({
                 'step': len(instructions) + 1,
@@ -160,5 +201,5 @@ class PathFinder:  # Make sure this class name matches
                 'road': '',
                 'distance': 0
             })
-        
-        return instructions
\ No newline at end of file
+
+        return instructions
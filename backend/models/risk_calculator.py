@@ -2,6 +2,38 @@ import numpy as np
 import json
 import os
 from datetime import datetime
+from models.instrumentation import metrics
+
+# Time-of-day risk multipliers as (hour the period ends, multiplier)
+TIME_MULTIPLIERS = [
+    (5, 2.0),   # Late night
+    (7, 1.4),   # Early morning
+    (10, 1.2),  # Morning rush
+    (16, 0.8),  # Day time
+    (19, 1.3),  # Evening rush
+    (22, 1.6),  # Evening
+    (24, 1.8),  # Night
+]
+
+def prepare_risk(graph, time_factor=True, current_hour=None):
+    """Run the risk pipeline on a networkx graph in place.
+
+    The time factor scales the propagated edge risks, so partitioned locations can
+    store the rest of the pipeline and apply it when they are loaded.
+    """
+    rc = RiskCalculator(graph)
+    with metrics.timer('prepare_base_risk_ms'):
+        rc.assign_base_risk_by_road_type()
+    with metrics.timer('prepare_incidents_ms'):
+        rc.create_sample_incidents()
+        rc.add_incident_risk()
+    with metrics.timer('prepare_propagate_ms'):
+        rc.propagate_risk()
+    if time_factor:
+        with metrics.timer('prepare_time_factor_ms'):
+            rc.apply_time_factor(current_hour)
+    with metrics.timer('prepare_node_risk_ms'):
+        rc.calculate_node_risk()
 
 class RiskCalculator:  # Make sure this class name matches exactly
     def __init__(self, graph):
@@ -109,26 +141,19 @@ class RiskCalculator:  # Make sure this class name matches exactly
         print(f"✅ Added incident risk to {count} edges")
         return self.graph
     
-    def apply_time_factor(self, current_hour=None):
-        """Apply time-based risk multipliers"""
+    @staticmethod
+    def time_multiplier(current_hour=None):
+        """Risk multiplier for an hour of the day (default: now)"""
         if current_hour is None:
             current_hour = datetime.now().hour
-        
-        # Time multipliers
-        if current_hour < 5:  # Late night
-            multiplier = 2.0
-        elif current_hour < 7:  # Early morning
-            multiplier = 1.4
-        elif current_hour < 10:  # Morning rush
-            multiplier = 1.2
-        elif current_hour < 16:  # Day time
-            multiplier = 0.8
-        elif current_hour < 19:  # Evening rush
-            multiplier = 1.3
-        elif current_hour < 22:  # Evening
-            multiplier = 1.6
-        else:  # Night
-            multiplier = 1.8
+        for end_hour, multiplier in TIME_MULTIPLIERS:
+            if current_hour < end_hour:
+                return multiplier
+        return TIME_MULTIPLIERS[-1][1]
+    
+    def apply_time_factor(self, current_hour=None):
+        """Apply time-based risk multipliers"""
+        multiplier = self.time_multiplier(current_hour)
         
         count = 0
         for u, v, key, data in self.graph.edges(keys=True, data=True):
@@ -0,0 +1,269 @@
+import concurrent.futures as cf
+import multiprocessing
+import os
+import threading
+from models.instrumentation import metrics, profiler, process_rss_bytes
+from models.partitions import PartitionedNetwork, make_path_finder
+
+
+class ServiceBusy(Exception):
+    """Raised when too many distinct route computations are already queued"""
+
+
+def compute_route(pf, start_lat, start_lon, end_lat, end_lon):
+    """Snap, search and describe a route; returns (status_code, payload)"""
+    # Partition cells the route touches stay loaded until the response is built
+    with pf.pinned():
+        return _compute_route(pf, start_lat, start_lon, end_lat, end_lon)
+
+
+def _compute_route(pf, start_lat, start_lon, end_lat, end_lon):
+    with metrics.timer('route_snap_ms'):
+        source = pf.find_nearest_node(start_lat, start_lon)
+        target = pf.find_nearest_node(end_lat, end_lon)
+
+    if source is None or target is None:
+        return 404, {'error': 'Could not find nearby roads'}
+
+    print(f"Source node: {source}, Target node: {target}")
+
+    # Find safest path
+    with metrics.timer('route_search_ms'):
+        path_nodes = pf.find_safest_route(source, target)
+
+    if not path_nodes:
+        return 404, {'error': 'No path found between these points'}
+
+    print(f"✅ Path found with {len(path_nodes)} nodes")
+
+    # Calculate statistics
+    # Edges are looked up once and shared by the statistics and instructions
+    with metrics.timer('route_stats_ms'):
+        hops = pf.route_hops(path_nodes)
+        risk = pf.calculate_path_risk(path_nodes, hops)
+        distance = pf.calculate_path_distance(path_nodes, hops)
+    with metrics.timer('route_instructions_ms'):
+        instructions = pf.generate_route_instructions(path_nodes, hops)
+    with metrics.timer('route_coordinates_ms'):
+        path_coords = pf.path_to_coordinates(path_nodes)
+    metrics.observe('route_path_nodes', len(path_nodes), [10, 50, 100, 250, 500, 1000, 5000])
+
+    response_data = {
+        'success': True,
+        'path': path_coords,
+        'instructions': instructions,
+        'statistics': {
+            'risk': risk,
+            'distance_m': distance,
+            'distance_km': round(distance / 1000, 2),
+            'time_min': round((distance / 1000) / 40 * 60, 1),
+            'mode': 'safest'
+        }
+    }
+
+    print(f"📊 Route stats: {response_data['statistics']['distance_km']}km, {response_data['statistics']['time_min']}min, risk: {risk:.2f}")
+    return 200, response_data
+
+
+# State of a worker process
+_worker_pf = None
+
+
+def _init_worker(network, workers):
+    global _worker_pf
+    # Locks may have been held by another thread at fork time
+    metrics.after_fork()
+    profiler.after_fork()
+    if hasattr(network, 'after_fork'):
+        network.after_fork(workers)
+    _worker_pf = make_path_finder(network)
+
+
+def _warm_up():
+    return os.getpid()
+
+
+def _worker_report():
+    """Memory and cache state of this worker, sent back with its metrics"""
+    report = {'pid': os.getpid(), 'rss_bytes': process_rss_bytes()}
+    if isinstance(_worker_pf.network, PartitionedNetwork):
+        report['network'] = _worker_pf.network.memory_report()
+    return report
+
+
+def _worker_route(start_lat, start_lon, end_lat, end_lon):
+    status, payload = compute_route(_worker_pf, start_lat, start_lon, end_lat, end_lon)
+    return status, payload, metrics.drain(), _worker_report()
+
+
+class RouteService:
+    """Runs route computations on a worker pool, sharing results between identical requests"""
+
+    def __init__(self, workers=None, max_pending=64, timeout=30, executor='process'):
+        self.workers = workers or os.cpu_count() or 2
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.executor_type = executor
+        if executor == 'process' and 'fork' not in multiprocessing.get_all_start_methods():
+            print("⚠️ Process workers need fork; using a thread pool instead")
+            self.executor_type = 'thread'
+        self.executor = None
+        self.network = None
+        self.pf = None
+        self._inflight = {}
+        self._restarting = False
+        # Latest report and gauges from each worker process of the current pool
+        self.worker_reports = {}
+        # Reentrant: a done callback runs inline when the future finishes before it is attached
+        self._lock = threading.RLock()
+
+    def _start_pool(self, network):
+        """New (executor, path finder) for a network, with its workers already started"""
+        if self.executor_type == 'process':
+            pf = None
+            executor = cf.ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('fork'),
+                initializer=_init_worker,
+                initargs=(network, self.workers)
+            )
+        else:
+            pf = make_path_finder(network)
+            executor = cf.ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='sheildx-route')
+        # Start the workers now rather than on the first request
+        try:
+            executor.submit(_warm_up).result()
+        except Exception:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        return executor, pf
+
+    def _swap_pool(self, network, executor, pf, replacing=None):
+        """Make a started pool current; with `replacing`, only if that pool is still current"""
+        with self._lock:
+            swapped = replacing is None or self.executor is replacing
+            if swapped:
+                old_executor = self.executor
+                self.executor, self.pf, self.network = executor, pf, network
+                self._inflight = {}
+                self.worker_reports = {}
+            else:
+                old_executor = executor
+        if old_executor is not None:
+            old_executor.shutdown(wait=False, cancel_futures=True)
+        if swapped:
+            metrics.set_gauge('route_queue_length', 0)
+        return swapped
+
+    def reset(self, network):
+        """Restart the pool for a newly loaded network"""
+        # Workers fork and warm up outside the lock so requests are never queued behind it
+        executor, pf = self._start_pool(network)
+        self._swap_pool(network, executor, pf)
+        print(f"✅ Route service ready with {self.workers} {self.executor_type} workers")
+
+    def route(self, start_lat, start_lon, end_lat, end_lon):
+        """Compute a route, joining an identical in-flight request if there is one.
+
+        If a worker dies the pool is rebuilt and the route retried once before giving up with ServiceBusy.
+        """
+        key = (round(start_lat, 6), round(start_lon, 6), round(end_lat, 6), round(end_lon, 6))
+
+        for attempt in range(2):
+            with self._lock:
+                executor = self.executor
+                if executor is None:
+                    raise ServiceBusy("Route service is not ready")
+                if self._restarting:
+                    metrics.increment('route_rejected')
+                    raise ServiceBusy("Route workers are restarting")
+                future = self._inflight.get(key)
+                if future is not None:
+                    metrics.increment('route_coalesced')
+                else:
+                    if len(self._inflight) >= self.max_pending:
+                        metrics.increment('route_rejected')
+                        raise ServiceBusy(f"{len(self._inflight)} routes already pending")
+                    try:
+                        if self.executor_type == 'process':
+                            future = executor.submit(_worker_route, *key)
+                        else:
+                            future = executor.submit(compute_route, self.pf, *key)
+                    except cf.BrokenExecutor:
+                        future = None
+                    else:
+                        self._inflight[key] = future
+                        metrics.set_gauge('route_queue_length', len(self._inflight))
+                        future.add_done_callback(lambda f, key=key: self._finished(key, f))
+
+            if future is not None:
+                try:
+                    result = future.result(timeout=self.timeout)
+                    return result[0], result[1]
+                except cf.BrokenExecutor:
+                    pass
+            self._recover(executor)
+
+        raise ServiceBusy("Route workers keep failing")
+
+    def _recover(self, broken):
+        """Replace a pool whose worker died, unless another request already is or has.
+
+        New requests get ServiceBusy while the replacement starts.
+        """
+        with self._lock:
+            if self.executor is not broken or self.network is None or self._restarting:
+                return
+            self._restarting = True
+            network = self.network
+        metrics.increment('route_pool_restarts')
+        print("⚠️ A route worker died; restarting the pool")
+        try:
+            executor, pf = self._start_pool(network)
+        except Exception as e:
+            raise ServiceBusy(f"Route workers could not be restarted: {e}")
+        else:
+            # A location loaded during the restart wins over the pool for the old one
+            if self._swap_pool(network, executor, pf, replacing=broken):
+                print(f"✅ Route pool restarted with {self.workers} {self.executor_type} workers")
+        finally:
+            with self._lock:
+                self._restarting = False
+
+    def _finished(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            metrics.set_gauge('route_queue_length', len(self._inflight))
+        if self.executor_type == 'process' and not future.cancelled() and future.exception() is None:
+            _, _, data, report = future.result()
+            metrics.merge(data)
+            report['gauges'] = data['gauges']
+            with self._lock:
+                self.worker_reports[report['pid']] = report
+                reports = list(self.worker_reports.values())
+            # Worker gauges such as partitions_resident are summed over the pool
+            names = {name for r in reports for name in r['gauges']}
+            for name in names:
+                metrics.set_gauge(f'workers_{name}', sum(r['gauges'].get(name, 0) for r in reports))
+
+    def worker_memory(self):
+        """Latest memory report from each worker process, or None for a thread pool"""
+        if self.executor_type != 'process':
+            return None
+        with self._lock:
+            reports = dict(self.worker_reports)
+        return {
+            'workers': self.workers,
+            'reporting': len(reports),
+            'rss_bytes': sum(r['rss_bytes'] or 0 for r in reports.values()),
+            'resident_bytes': sum(r['network']['total_bytes'] for r in reports.values() if 'network' in r),
+            'by_pid': reports
+        }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self.executor = self.executor, None
+            self._inflight = {}
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -1,9 +1,6 @@
-import networkx as nx
-import numpy as np
-
 class SafeHavenFinder:  # Make sure this class name matches
-    def __init__(self, graph, city_name="Coimbatore"):
-        self.graph = graph
+    def __init__(self, network, city_name="Coimbatore"):
+        self.network = network
         self.city_name = city_name
         self.safe_havens = []
         print("✅ SafeHavenFinder initialized")
@@ -27,22 +24,4 @@ class SafeHavenFinder:  # Make sure this class name matches
     
     def find_nearest_node(self, lat, lon):
         """Find nearest graph node to coordinates"""
-        min_dist = float('inf')
-        nearest = None
-        
-        for node in self.graph.nodes():
-            try:
-                node_lat = self.graph.nodes[node]['y']
-                node_lon = self.graph.nodes[node]['x']
-                
-                lat_diff = (lat - node_lat) * 111320
-                lon_diff = (lon - node_lon) * 111320 * np.cos(np.radians(lat))
-                dist = np.sqrt(lat_diff**2 + lon_diff**2)
-                
-                if dist < min_dist:
-                    min_dist = dist
-                    nearest = node
-            except:
-                continue
-                
-        return nearest
\ No newline at end of file
+        return self.network.nearest_node(lat, lon)
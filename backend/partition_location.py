@@ -0,0 +1,51 @@
+"""Split a saved location into on-disk partitions, outside the Flask server.
+
+Run from the repository root, like the server:
+    python backend/partition_location.py backend/data/coimbatore.pkl --cell-size-m 5000
+
+POST /api/partition-location starts this script as a background job.
+"""
+import argparse
+import os
+import pickle
+import sys
+from models.partitions import build_partitions
+from models.risk_calculator import TIME_MULTIPLIERS, prepare_risk
+
+
+def partition_location(file_path, out_dir=None, cell_size_m=5000):
+    """Build <name>_partitions beside a saved .pkl location and return its manifest"""
+    if out_dir is None:
+        name = os.path.basename(file_path).replace('.pkl', '')
+        out_dir = os.path.join(os.path.dirname(file_path), f"{name}_partitions")
+
+    with open(file_path, 'rb') as f:
+        graph = pickle.load(f)
+
+    print(f"🧩 Partitioning {file_path} into {cell_size_m:.0f}m cells...")
+    # The time factor is applied when the partitions are loaded, not baked into them
+    return build_partitions(graph, out_dir, cell_size_m,
+                            prepare=lambda sub: prepare_risk(sub, time_factor=False),
+                            risk_multipliers=[m for _, m in TIME_MULTIPLIERS])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Partition a saved SHEild-X location")
+    parser.add_argument('file', help="Saved .pkl location")
+    parser.add_argument('--cell-size-m', type=float, default=5000, help="Side of the square cells in metres")
+    parser.add_argument('--out', help="Output directory (default: <name>_partitions beside the .pkl)")
+    args = parser.parse_args(argv)
+
+    if not os.path.isfile(args.file):
+        print(f"❌ File not found: {args.file}")
+        return 1
+    if args.cell_size_m <= 0:
+        print("❌ Cell size must be positive")
+        return 1
+
+    partition_location(args.file, args.out, args.cell_size_m)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())